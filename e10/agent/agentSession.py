@@ -1,9 +1,9 @@
-from dataclasses import dataclass, asdict, field
+from dataclasses import dataclass, field, fields
 from typing import Any, Literal, Optional, List
-import uuid
+import os
 import time
 import json
-from config.log_config import setup_logging
+from config.log_config import setup_logging, pretty_json
 from .human_intervention import HumanIntervention
 from datetime import datetime
 
@@ -21,7 +21,7 @@ class ToolCode:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class PerceptionSnapshot:
     entities: list[str]
     result_requirement: str
@@ -32,8 +32,24 @@ class PerceptionSnapshot:
     last_tooluse_summary: str
     solution_summary: str
     confidence: str
+    _serialized: Optional[str] = field(default=None, init=False, repr=False, compare=False)
 
-@dataclass
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in PERCEPTION_FIELDS}
+
+    @property
+    def serialized(self) -> str:
+        """Indented JSON of the snapshot, built once since snapshots are never mutated."""
+        if self._serialized is None:
+            self._serialized = pretty_json(self.to_dict())
+        return self._serialized
+
+    def __str__(self) -> str:
+        return self.serialized
+
+PERCEPTION_FIELDS = tuple(f.name for f in fields(PerceptionSnapshot) if f.init)
+
+@dataclass(slots=True)
 class Step:
     index: int
     description: str
@@ -47,6 +63,7 @@ class Step:
     attempts: int = 0
     was_replanned: bool = False
     parent_index: Optional[int] = None
+    confidence: Optional[float] = None  # decision's own confidence, set on CONCLUDE steps
     human_interventions: List[HumanIntervention] = field(default_factory=list)
 
     def add_human_intervention(self, intervention: HumanIntervention):
@@ -58,7 +75,11 @@ class Step:
             self.status = "failed"
 
     def to_dict(self):
-        return {
+        """
+        A fresh dict on every call: nested objects (interventions, tool arguments) change in place,
+        which no memo keyed on field assignment can see, and callers are free to mutate the result.
+        """
+        step_dict = {
             "index": self.index,
             "description": self.description,
             "type": self.type,
@@ -66,21 +87,32 @@ class Step:
             "conclusion": self.conclusion,
             "execution_result": self.execution_result,
             "error": self.error,
-            "perception": self.perception.__dict__ if self.perception else None,
+            "perception": self.perception.to_dict() if self.perception else None,
             "status": self.status,
             "attempts": self.attempts,
             "was_replanned": self.was_replanned,
             "parent_index": self.parent_index,
             "human_interventions": [hi.to_dict() for hi in self.human_interventions]
         }
+        # Only CONCLUDE steps carry the decision's confidence; other steps keep the original schema
+        if self.confidence is not None:
+            step_dict["confidence"] = self.confidence
+        return step_dict
+
+
+def new_session_id() -> str:
+    """Random 128-bit hex id; cheaper than building a UUID object and formatting it with dashes."""
+    return os.urandom(16).hex()
 
 
 class AgentSession:
-    def __init__(self, session_id: str, original_query: str):
-        self.session_id = session_id
+    def __init__(self, session_id: Optional[str] = None, original_query: str = ""):
+        self._session_id = session_id  # generated on first access when not given
         self.original_query = original_query
         self.perception: Optional[PerceptionSnapshot] = None
         self.plan_versions: list[dict[str, Any]] = []
+        self.current_plan_text: list[str] = []
+        self._completed_steps_cache: list[Step] = []  # completed steps of the latest plan version
         self.state = {
             "original_goal_achieved": False,
             "final_answer": None,
@@ -90,6 +122,16 @@ class AgentSession:
             
         }
 
+    @property
+    def session_id(self) -> str:
+        if self._session_id is None:
+            self._session_id = new_session_id()
+        return self._session_id
+
+    @session_id.setter
+    def session_id(self, value: Optional[str]):
+        self._session_id = value
+
     def add_perception(self, snapshot: PerceptionSnapshot):
         logger.info("\n📋 Perception Snapshot updated in AgentSession")
         self.perception = snapshot
@@ -100,8 +142,28 @@ class AgentSession:
             "steps": steps.copy()
         }
         self.plan_versions.append(plan)
+        self.current_plan_text = plan_texts
+        self._completed_steps_cache = [s for s in plan["steps"] if s.status == "completed"]
         return steps[0] if steps else None  # ✅ fix: return first Step
 
+    def mark_step_completed(self, step: Step):
+        step.status = "completed"
+        if self.plan_versions and any(s is step for s in self.plan_versions[-1]["steps"]) \
+                and not any(s is step for s in self._completed_steps_cache):
+            self._completed_steps_cache.append(step)
+
+    def add_human_intervention(self, step: Step, intervention: HumanIntervention):
+        """Record an intervention on a step, keeping the completed-steps cache in line with its new status."""
+        step.add_human_intervention(intervention)
+        if step.status == "completed":
+            self.mark_step_completed(step)
+        else:
+            self._completed_steps_cache = [s for s in self._completed_steps_cache if s is not step]
+
+    def completed_steps(self) -> list[dict]:
+        """Dicts of the completed steps in the latest plan version."""
+        return [s.to_dict() for s in self._completed_steps_cache]
+
     def get_next_step_index(self) -> int:
         return sum(len(v["steps"]) for v in self.plan_versions)
 
@@ -115,11 +177,11 @@ class AgentSession:
         return {
             "session_id": self.session_id,
             "original_query": self.original_query,
-            "perception": asdict(self.perception) if self.perception else None,
+            "perception": self.perception.to_dict() if self.perception else None,
             "plan_versions": [
                 {
                     "plan_text": p["plan_text"],
-                    "steps": [asdict(s) for s in p["steps"]]
+                    "steps": [s.to_dict() for s in p["steps"]]
                 } for p in self.plan_versions
             ],
             "state_snapshot": self.get_snapshot_summary()
@@ -131,7 +193,7 @@ class AgentSession:
             "query": self.original_query,
             "final_plan": self.plan_versions[-1]["plan_text"] if self.plan_versions else [],
            "final_steps": [
-                    asdict(s)
+                    s.to_dict()
                     for version in self.plan_versions
                     for s in version["steps"]
                     if s.status == "completed"
@@ -160,7 +222,7 @@ class AgentSession:
 
         if self.perception:
             print("\n[Perception 0] Initial ERORLL:")
-            print(f"  {asdict(self.perception)}")
+            print(f"  {self.perception.to_dict()}")
             time.sleep(delay)
 
         for i, version in enumerate(self.plan_versions):
@@ -184,7 +246,7 @@ class AgentSession:
                     print(f"  Error: {step.error}")
                 if step.perception:
                     print("  Perception ERORLL:")
-                    for k, v in asdict(step.perception).items():
+                    for k, v in step.perception.to_dict().items():
                         print(f"    {k}: {v}")
                 print(f"  Status: {step.status}")
                 if step.was_replanned:
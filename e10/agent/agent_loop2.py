@@ -1,27 +1,45 @@
-import uuid
+import copy
+import hashlib
 import json
-import datetime
-import yaml
+import numpy as np
+from collections import OrderedDict, deque
 from perception.perception import Perception
 from decision.decision import Decision
 from action.executor import run_user_code
 from agent.agentSession import AgentSession, PerceptionSnapshot, Step, ToolCode
-from memory.session_log import live_update_session
-from memory.memory_search import MemorySearch
+from memory.session_log import live_update_session, flush_session_updates, get_memory_version
+from memory.memory_search import get_memory_search
+from memory.embeddings import embed_with_cache
+from memory.semantic_cache import QVCache
 from mcp_servers.multiMCP import MultiMCP
-from config.log_config import setup_logging
-from datetime import datetime
+from config.log_config import setup_logging, LazyJSON
+from config.profiles import load_profiles
 from agent.human_intervention import HumanIntervention, HumanInterventionHandler
 from agent.exceptions import HumanInterventionError
 import asyncio
 from typing import Optional
 from .tool_simulation import ToolSimulation
-from .utils import show_input_dialog  # Add this import at the top
 
 
 logger = setup_logging(__name__)
 
 GLOBAL_PREVIOUS_FAILURE_STEPS = 3
+MEMORY_CACHE_SIZE = 512
+MEMORY_CACHE_THRESHOLD = 0.97
+PERCEPTION_CACHE_SIZE = 1024
+CONCLUDE_MIN_CHARS = 20        # shorter conclusions are always re-checked by perception
+CONCLUDE_MIN_CONFIDENCE = 0.9
+
+# Limit-reached conclusions; specialized with the configured limits in AgentLoop.__init__
+_MAX_STEPS_REACHED_CONCLUSION = "Execution stopped after {n} steps due to step limit."
+_MAX_STEPS_REACHED_ANSWER = "Execution stopped after {n} steps. Please try a more specific query or break down your request into smaller parts."
+_MAX_RETRIES_REACHED_CONCLUSION = "Step {index} failed after {attempts} attempts. Please try a different approach."
+
+# Shape of decision inputs; values are assembled positionally in _build_decision_input
+_INITIAL_KEYS = ("plan_mode", "planning_strategy", "original_query", "perception")
+_MID_SESSION_KEYS = ("plan_mode", "planning_strategy", "original_query", "current_plan_version",
+                     "current_plan", "completed_steps", "current_step")
+
 
 class AgentLoop:
     def __init__(self, perception_prompt_path: str, decision_prompt_path: str, multi_mcp: MultiMCP, strategy: str = "exploratory"):
@@ -31,68 +49,161 @@ class AgentLoop:
         self.strategy = strategy
         
         # Load configuration from profiles.yaml
-        with open("config/profiles.yaml", "r") as f:
-            config = yaml.safe_load(f)
-            self.max_steps = config["strategy"]["max_steps"]
-            self.max_lifelines = config["strategy"]["max_lifelines_per_step"]
-            self.human_intervention = config["strategy"]["human_intervention"]
-            self.tool_simulation = ToolSimulation(config["strategy"]["tool_simulation"])
+        config = load_profiles()
+        self.max_steps = config["strategy"]["max_steps"]
+        self.max_lifelines = config["strategy"]["max_lifelines_per_step"]
+        self.human_intervention = config["strategy"]["human_intervention"]
+        self._max_steps_state_base = {
+            "original_goal_achieved": False,
+            "confidence": 0.8,
+            "reasoning_note": "Step limit reached",
+            "solution_summary": f"Maximum steps ({self.max_steps}) reached. Please refine your query."
+        }
+        self._max_retries_summary = f"Maximum retries ({self.max_lifelines}) reached for step {{index}}. Please try a different approach."
+        self.tool_simulation = ToolSimulation(config["strategy"]["tool_simulation"])
+        semantic_cache_config = config["strategy"].get("semantic_cache", {})
+        self.speculative_planning = config["strategy"].get("speculative_planning", False)
+        self.skip_conclude_perception = config["strategy"].get("skip_conclude_perception", False)
+        self.tentative_perception = config["strategy"].get("tentative_perception", False)
+        self.fast_step_perception = config["strategy"].get("fast_step_perception", False)
+
+        # Decisions are only cached on the exact input (inside Decision): a near-identical input with a
+        # different number or tool result must not replay another step's plan
+        if semantic_cache_config.get("enabled"):
+            self.semantic_cache = QVCache(semantic_cache_config.get("threshold", 0.92))
+            self.perception_cache = QVCache(semantic_cache_config.get("perception_threshold", 0.97))
+        else:
+            self.semantic_cache = self.perception_cache = None
+
+        self._memory_searcher = get_memory_search()
+        self._memory_cache_version = get_memory_version()
+        self._memory_exact_cache = OrderedDict()
+        self._memory_approx_cache = QVCache(MEMORY_CACHE_THRESHOLD, min_threshold=MEMORY_CACHE_THRESHOLD)
+        self._perception_exact_cache = OrderedDict()  # perception_exact_key -> perception result
+        self.perception_cache_stats = {"hits": 0, "misses": 0}
         
         self.total_steps_executed = 0
         self.step_retries = {}  # Track retries per step
-        self.human_input_queue = asyncio.Queue()
-        self.human_input_event = asyncio.Event()
+        self.speculative_plan = None  # (step index, plan version, decision input, decision task) planned ahead of perception
+        self.speculation_stats = {"hits": 0, "misses": 0}
+        self.human_input_queue: Optional[asyncio.Queue] = None  # created on first use, inside the running loop
         self.human_intervention_handler = HumanInterventionHandler(max_lifelines=self.max_lifelines)
 
     async def run(self, query: str):
-        session = AgentSession(
-            session_id=str(uuid.uuid4()), 
-            original_query=query
-        )
-        session_memory = []
+        # Embedding the query and scanning memory are independent, so overlap them
+        self.refresh_memory_cache()
+        embed_task = asyncio.create_task(self.embed_query_async(query))
+        memory_task = asyncio.create_task(self.search_memory_async(query))
+        tentative_task = None
+        try:
+            query_embedding = await embed_task
+
+            use_semantic = self.semantic_cache is not None and query_embedding is not None
+            cached = self.semantic_cache.lookup(query_embedding) if use_semantic else None
+            if cached:
+                session = self.rehydrate_cached_session(cached[1], query)
+                await flush_session_updates(fsync=True)
+                return session
+
+            cached = self._memory_approx_cache.lookup(query_embedding)
+            if cached:
+                memory_results = cached[1]
+            else:
+                if self.tentative_perception:
+                    # Perception without memory overlaps the memory search and often already answers the query
+                    tentative_task = asyncio.create_task(self.run_perception(query, []))
+                memory_results = await memory_task
+                self._memory_approx_cache.add(query_embedding, memory_results)
+
+            session = await self.run_session(query, memory_results, tentative_task)
+        finally:
+            await self.cancel_tasks(embed_task, memory_task, tentative_task)
+
+        # Callers read the session file back (e.g. extract_session_state), so it must be on disk
+        await flush_session_updates(fsync=True)
+
+        if use_semantic and session.state["original_goal_achieved"]:
+            self.semantic_cache.add(query_embedding, copy.deepcopy(session), fingerprint=session.state["final_answer"])
+        return session
+
+    async def initial_perception(self, query, memory_results, tentative_task=None):
+        """
+        Perception of the user query. A memory-less tentative result is used as is when it already
+        achieves the goal, or when memory search found nothing (the inputs would be identical).
+        """
+        if tentative_task is None:
+            return await self.run_perception(query, memory_results)
+        if not memory_results:
+            return await tentative_task
+
+        full_task = asyncio.create_task(self.run_perception(query, memory_results))
+        try:
+            tentative_result = await tentative_task
+            if tentative_result.get("original_goal_achieved"):
+                logger.info("⚡ Tentative perception answered the query without memory")
+                return tentative_result
+            return await full_task
+        finally:
+            await self.cancel_tasks(full_task)
+
+    @staticmethod
+    async def cancel_tasks(*tasks):
+        """Cancel whichever tasks are unfinished and wait for them, so none is left with an unretrieved exception."""
+        tasks = [task for task in tasks if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def rehydrate_cached_session(self, cached_session, query):
+        session = copy.deepcopy(cached_session)
+        session.session_id = None  # fresh id, generated when first logged
+        session.original_query = query
+        self.log_session_start(session, query)
+        logger.info("\n⚡ Reusing answer from a semantically equivalent previous session.")
+        live_update_session(session)
+        return session
+
+    async def run_session(self, query: str, memory_results: list, tentative_task: Optional[asyncio.Task] = None):
+        session = AgentSession(original_query=query)
+        session_memory = deque(maxlen=GLOBAL_PREVIOUS_FAILURE_STEPS)
         self.log_session_start(session, query)
         self.total_steps_executed = 0  # Reset step counter for new session
         self.step_retries = {}  # Reset retries
+        self.speculation_stats = {"hits": 0, "misses": 0}
 
-        memory_results = self.search_memory(query)
-        perception_result = self.run_perception(query, memory_results, memory_results)
-        logger.info("\n📋 [Perception Result]: \n%s", json.dumps(perception_result, indent=2, ensure_ascii=False))
+        perception_result = await self.initial_perception(query, memory_results, tentative_task)
         session.add_perception(PerceptionSnapshot(**perception_result))
+        logger.info("\n📋 [Perception Result]: \n%s", session.perception)
 
         if perception_result.get("original_goal_achieved"):
             self.handle_perception_completion(session, perception_result)
             return session
 
-        decision_output = self.make_initial_decision(query, perception_result)
-        logger.info("\n📝 [Decision Output]: \n%s", json.dumps(decision_output, indent=2, ensure_ascii=False))
+        decision_output = await self.make_initial_decision(query, perception_result)
+        logger.info("\n📝 [Decision Output]: \n%s", LazyJSON(decision_output))
         step = session.add_plan_version(decision_output["plan_text"], [self.create_step(decision_output)])
         live_update_session(session)
-        logger.info(f"\n📝 [Decision Plan Text: V{len(session.plan_versions)}]:")
-        for line in session.plan_versions[-1]["plan_text"]:
-            logger.info(f"  {line}")
+        logger.info("\n📝 [Decision Plan Text: V%d]:", len(session.plan_versions))
+        for line in session.current_plan_text:
+            logger.info("  %s", line)
 
         #First implementation the max steps and max retries
         # If a plan fails, 
         while step:
             # Check max steps before executing
-            logger.info(f"\n⚙️ [Out of {self.max_steps} steps, trying to execute step number {self.total_steps_executed + 1}]")
+            logger.info("\n⚙️ [Out of %d steps, trying to execute step number %d]", self.max_steps, self.total_steps_executed + 1)
             if self.total_steps_executed >= self.max_steps:
-                logger.info(f"\n⚠️ Maximum steps ({self.max_steps}) reached. Stopping execution.")
+                logger.info("\n⚠️ Maximum steps (%d) reached. Stopping execution.", self.max_steps)
                 conclusion_step = self.create_conclusion_step(
                     "Maximum steps reached",
-                    f"Execution stopped after {self.total_steps_executed} steps due to step limit."
+                    _MAX_STEPS_REACHED_CONCLUSION.format(n=self.total_steps_executed)
                 )
                 session.add_plan_version(
                     [f"Step {self.total_steps_executed + 1}: Maximum steps reached"],
                     [conclusion_step]
                 )
-                session.state.update({
-                    "original_goal_achieved": False,
-                    "final_answer": f"Execution stopped after {self.total_steps_executed} steps. Please try a more specific query or break down your request into smaller parts.",
-                    "confidence": 0.8,
-                    "reasoning_note": "Step limit reached",
-                    "solution_summary": f"Maximum steps ({self.max_steps}) reached. Please refine your query."
-                })
+                session.state.update(self._max_steps_state_base,
+                                     final_answer=_MAX_STEPS_REACHED_ANSWER.format(n=self.total_steps_executed))
                 live_update_session(session)
                 break
 
@@ -109,20 +220,28 @@ class AgentLoop:
             # Track step execution
             self.total_steps_executed += 1
 
-            logger.info("\n⚙️ [Evaluating Step Summary]: \n%s", json.dumps(step_result.to_dict(), indent=2, ensure_ascii=False))
+            logger.info("\n⚙️ [Evaluating Step Summary]: \n%s", LazyJSON(step_result.to_dict()))
             step = await self.evaluate_step(step_result, session, query)
 
+        self.discard_speculative_plan()
         return session
 
     def log_session_start(self, session, query):
         logger.info("\n=== LIVE AGENT SESSION TRACE ===")
-        logger.info(f"Session ID: {session.session_id}")
-        logger.info(f"Query: {query}")
+        logger.info("Session ID: %s", session.session_id)
+        logger.info("Query: %s", query)
+
+    async def embed_query_async(self, query):
+        # Needed by the approximate memory lane even when the session cache is off; shared with
+        # MemorySearch's vector lane through embed_with_cache
+        return await asyncio.to_thread(embed_with_cache, query)
+
+    async def search_memory_async(self, query):
+        return await asyncio.to_thread(self.search_memory, query)
 
     def search_memory(self, query):
         logger.info("Searching Recent Conversation History")
-        searcher = MemorySearch()
-        results = searcher.search_memory(query)
+        results = self.cached_memory_search(query)
         if not results:
             logger.info("❌ No matching memory entries found.\n")
         else:
@@ -131,23 +250,100 @@ class AgentLoop:
                 print(f"[{i}] File: {res['file']}\nQuery: {res['query']}\nResult Requirement: {res['result_requirement']}\nSummary: {res['solution_summary']}\n")
         return results
 
-    def run_perception(self, query, memory_results, session_memory=None, snapshot_type="user_query", current_plan=None):
+    def refresh_memory_cache(self):
+        # Memory only changes when a completed session is written, which bumps the version
+        version = get_memory_version()
+        if version != self._memory_cache_version:
+            self._memory_exact_cache.clear()
+            self._memory_approx_cache = QVCache(MEMORY_CACHE_THRESHOLD, min_threshold=MEMORY_CACHE_THRESHOLD)
+            self._memory_cache_version = version
+
+    def cached_memory_search(self, query):
+        key = (self._memory_cache_version, query)
+        if key in self._memory_exact_cache:
+            logger.info("⚡ Memory search cache hit (exact)")
+            self._memory_exact_cache.move_to_end(key)
+            return self._memory_exact_cache[key]
+
+        results = self._memory_searcher.search_memory(query)
+        self._memory_exact_cache[key] = results
+        if len(self._memory_exact_cache) > MEMORY_CACHE_SIZE:
+            self._memory_exact_cache.popitem(last=False)
+        return results
+
+    async def run_perception(self, query, memory_results, session_memory=None, snapshot_type="user_query", current_plan=None):
         logger.info(
             "Running Perception with query: %s and memory_results: %s and session_memory: %s and current_plan: %s and snapshot_type: %s",
             query, memory_results, session_memory, current_plan, snapshot_type
         )
-        combined_memory = (memory_results or []) + (session_memory or [])
+        combined_memory = [*(memory_results or []), *(session_memory or [])]
         perception_input = self.perception.build_perception_input(
             raw_input=query, 
             memory=combined_memory, 
             current_plan=current_plan, 
             snapshot_type=snapshot_type
         )
-        logger.info("\n📋 [Perception Input]: \n%s", json.dumps(perception_input, indent=2, ensure_ascii=False))
-        perception_result = self.perception.run(perception_input)
-        #logger.info("\n📋 [Perception Result]: \n%s", json.dumps(perception_result, indent=2, ensure_ascii=False))
+        logger.info("\n📋 [Perception Input]: \n%s", LazyJSON(perception_input))
+
+        # Deterministic tools often return the same result for the same plan; skip the LLM entirely then
+        exact_key = self.perception_exact_key(query, snapshot_type, combined_memory, current_plan)
+        if exact_key in self._perception_exact_cache:
+            self._perception_exact_cache.move_to_end(exact_key)
+            self.perception_cache_stats["hits"] += 1
+            logger.debug("⚡ Perception exact cache hit (%s)", self.perception_cache_stats)
+            return copy.deepcopy(self._perception_exact_cache[exact_key])
+        self.perception_cache_stats["misses"] += 1
+        logger.debug("🔎 Perception exact cache miss (%s)", self.perception_cache_stats)
+
+        # Step results differ in exactly the values an embedding blurs, so only user queries take the semantic lane
+        use_semantic = self.perception_cache is not None and snapshot_type == "user_query"
+        input_embedding = await self.embed_perception_key(perception_input, combined_memory) if use_semantic else None
+        cached = self.perception_cache.lookup(input_embedding) if input_embedding is not None else None
+        if cached:
+            return copy.deepcopy(cached[1])
+
+        perception_result = await self.perception.run_async(perception_input)
+        if not self.perception.is_cacheable(perception_result):
+            return perception_result
+        self._perception_exact_cache[exact_key] = copy.deepcopy(perception_result)
+        if len(self._perception_exact_cache) > PERCEPTION_CACHE_SIZE:
+            self._perception_exact_cache.popitem(last=False)
+        if input_embedding is not None:
+            self.perception_cache.add(input_embedding, copy.deepcopy(perception_result), fingerprint=json.dumps(perception_result, sort_keys=True))
         return perception_result
 
+    @staticmethod
+    def perception_exact_key(raw_input, snapshot_type, memory, current_plan) -> str:
+        memory_ids = [(m["query"], m["result_requirement"], m["solution_summary"]) for m in memory]
+        payload = json.dumps([raw_input, snapshot_type, memory_ids, current_plan], default=str, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+    async def embed_perception_key(self, perception_input: dict, memory: list):
+        # Memory entries recur across queries; the bounded process-wide embedding cache embeds each once
+        text_embedding = await asyncio.to_thread(embed_with_cache, json.dumps({
+            "snapshot_type": perception_input["snapshot_type"],
+            "raw_input": perception_input["raw_input"],
+            "current_plan": perception_input["current_plan"]
+        }, sort_keys=True, ensure_ascii=False))
+        if text_embedding is None or not memory:
+            return text_embedding
+
+        memory_embeddings = [await self.embed_memory_entry(entry) for entry in memory]
+        if any(embedding is None for embedding in memory_embeddings):
+            return None
+        key = text_embedding + np.concatenate([e.reshape(1, -1) for e in memory_embeddings]).mean(axis=0)
+        return key / np.linalg.norm(key)
+
+    @staticmethod
+    def memory_entry_text(entry: dict) -> str:
+        return " | ".join((entry["query"], entry["result_requirement"], entry["solution_summary"]))
+
+    async def embed_memory_entry(self, entry: dict):
+        return await asyncio.to_thread(embed_with_cache, self.memory_entry_text(entry))
+
+    async def run_decision(self, decision_input: dict) -> dict:
+        return await self.decision.run_async(decision_input)
+
     def handle_perception_completion(self, session, perception_result):
         print("\n✅ Perception fully answered the query.")
         session.state.update({
@@ -159,15 +355,21 @@ class AgentLoop:
         })
         live_update_session(session)
 
-    def make_initial_decision(self, query, perception_result):
-        decision_input = {
-            "plan_mode": "initial",
-            "planning_strategy": self.strategy,
-            "original_query": query,
-            "perception": perception_result
-        }
-        decision_output = self.decision.run(decision_input)
-        return decision_output
+    def _build_decision_input(self, plan_mode, query, session=None, step=None, perception=None, human_input=None) -> dict:
+        """Decision input for the initial plan (perception given) or a mid-session step (session and step given)."""
+        if plan_mode == "initial":
+            return dict(zip(_INITIAL_KEYS, (plan_mode, self.strategy, query, perception)))
+
+        decision_input = dict(zip(_MID_SESSION_KEYS, (
+            plan_mode, self.strategy, query, len(session.plan_versions),
+            session.current_plan_text, session.completed_steps(), step.to_dict()
+        )))
+        if human_input is not None:
+            decision_input["human_input"] = human_input
+        return decision_input
+
+    async def make_initial_decision(self, query, perception_result):
+        return await self.run_decision(self._build_decision_input("initial", query, perception=perception_result))
 
     def create_step(self, decision_output):
         return Step(
@@ -176,11 +378,37 @@ class AgentLoop:
             type=decision_output["type"],
             code=ToolCode(tool_name="raw_code_block", tool_arguments={"code": decision_output["code"]}) if decision_output["type"] == "CODE" else None,
             conclusion=decision_output.get("conclusion"),
+            confidence=self.parse_confidence(decision_output.get("confidence")),
             attempts=0,  # Initialize attempts counter
             was_replanned=False,  # Initialize replan flag
             parent_index=None  # Initialize parent index
         )
 
+    @staticmethod
+    def parse_confidence(value) -> Optional[float]:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def conclusion_snapshot(self, step) -> Optional[PerceptionSnapshot]:
+        """Perception for a CONCLUDE step that is confident enough to stand on its own, else None."""
+        if not self.skip_conclude_perception or step.confidence is None:
+            return None
+        if len(step.conclusion or "") < CONCLUDE_MIN_CHARS or step.confidence < CONCLUDE_MIN_CONFIDENCE:
+            return None
+        return PerceptionSnapshot(
+            entities=[],
+            result_requirement="Final answer to the original query.",
+            original_goal_achieved=True,
+            reasoning=f"Decision concluded with confidence {step.confidence:.2f}; final perception skipped.",
+            local_goal_achieved=True,
+            local_reasoning="Conclusion produced directly by the decision step.",
+            last_tooluse_summary="None",
+            solution_summary=step.conclusion,
+            confidence="0.95"
+        )
+
     async def get_human_input(self, step: Step, tool_name: str, tool_args: dict, error: str) -> HumanIntervention:
         """Delegate to the human intervention handler"""
         return await self.human_intervention_handler.get_human_input(step, tool_name, tool_args, error)
@@ -188,21 +416,21 @@ class AgentLoop:
     async def execute_step(self, step, session, session_memory):
         # Check max steps
         if self.total_steps_executed >= self.max_steps:
-            logger.info(f"\n⚠️ Maximum steps ({self.max_steps}) reached. Stopping execution.")
+            logger.info("\n⚠️ Maximum steps (%d) reached. Stopping execution.", self.max_steps)
             return self.create_conclusion_step(
                 "Maximum steps reached",
-                f"Execution stopped after {self.total_steps_executed} steps due to step limit."
+                _MAX_STEPS_REACHED_CONCLUSION.format(n=self.total_steps_executed)
             )
 
         # Check max lifelines
         if step.attempts >= self.max_lifelines:
-            logger.info(f"\n⚠️ Maximum retries ({self.max_lifelines}) reached for step {step.index}.")
+            logger.info("\n⚠️ Maximum retries (%d) reached for step %d.", self.max_lifelines, step.index)
             return self.create_conclusion_step(
                 "Maximum retries reached",
-                f"Step {step.index} failed after {step.attempts} attempts. Please try a different approach."
+                _MAX_RETRIES_REACHED_CONCLUSION.format(index=step.index, attempts=step.attempts)
             )
 
-        logger.info(f"\n⚙️ [Step {step.index}] {step.description}")
+        logger.info("\n⚙️ [Step %d] %s", step.index, step.description)
 
         if step.type == "CODE":
             logger.info("%s\n⚙️  [EXECUTING CODE]\n%s", "-" * 50, step.code.tool_arguments["code"])
@@ -217,11 +445,11 @@ class AgentLoop:
                         
                 executor_response = await run_user_code(step.code.tool_arguments["code"], self.multi_mcp)
                 step.execution_result = executor_response
-                step.status = "completed"
+                session.mark_step_completed(step)
 
             except Exception as e:
                 if self.human_intervention["enabled"]:
-                    logger.info(f"\n⚠️ Tool execution failed, requesting human intervention...")
+                    logger.info("\n⚠️ Tool execution failed, requesting human intervention...")
                     try:
                         # Get human input
                         intervention = await self.get_human_input(
@@ -232,7 +460,7 @@ class AgentLoop:
                         )
                         
                         # Add the intervention to the step
-                        step.add_human_intervention(intervention)
+                        session.add_human_intervention(step, intervention)
                         
                         # Create a mock tool result with human input
                         executor_response = {
@@ -241,12 +469,12 @@ class AgentLoop:
                             "source": "human_intervention"
                         }
                         step.execution_result = executor_response
-                        step.status = "completed"
+                        session.mark_step_completed(step)
                         
-                        logger.info(f"\n✅ Human provided input: {intervention.human_input[:100]}...")
+                        logger.info("\n✅ Human provided input: %.100s...", intervention.human_input)
                         
                     except HumanInterventionError as he:
-                        logger.error(f"\n❌ Human intervention failed: {str(he)}")
+                        logger.error("\n❌ Human intervention failed: %s", he)
                         step.attempts += 1
                         if step.attempts < self.max_lifelines:
                             return self.evaluate_step(step, session, session.original_query)
@@ -254,19 +482,30 @@ class AgentLoop:
                 else:
                     raise e
 
-            logger.info("\n⚙️ [Executor Response]: \n%s", json.dumps(executor_response, indent=2, ensure_ascii=False))
+            logger.info("\n⚙️ [Executor Response]: \n%s", LazyJSON(executor_response))
 
             logger.info("\n⚙️ [Decoding executor response via perception]")
 
-            perception_result = self.run_perception(
-                query=executor_response.get('result', 'Tool Failed'),
-                memory_results=session_memory,
-                current_plan=session.plan_versions[-1]["plan_text"],
-                snapshot_type="step_result"
-            )
+            if self.speculative_planning:
+                self.start_speculative_plan(session, step)
+
+            perception_result = None
+            if self.fast_step_perception:
+                perception_result = self.perception.try_fast_path(executor_response, session.current_plan_text, step.index)
+            if perception_result is not None:
+                logger.info("⚡ Trivial intermediate result, skipping step perception")
+            else:
+                # Queued for the background writer, which persists it while perception decodes the result
+                live_update_session(session)
+                perception_result = await self.run_perception(
+                    query=executor_response.get('result', 'Tool Failed'),
+                    memory_results=session_memory,
+                    current_plan=session.current_plan_text,
+                    snapshot_type="step_result"
+                )
 
-            logger.info("\n📋 [Post-Execution Perception Result]: \n%s", json.dumps(perception_result, indent=2, ensure_ascii=False))
             step.perception = PerceptionSnapshot(**perception_result)
+            logger.info("\n📋 [Post-Execution Perception Result]: \n%s", step.perception)
 
             if not step.perception or not step.perception.local_goal_achieved:
                 failure_memory = {
@@ -274,34 +513,42 @@ class AgentLoop:
                     "result_requirement": "Tool failed",
                     "solution_summary": str(step.execution_result)[:300]
                 }
-                session_memory.append(failure_memory)
-
-                if len(session_memory) > GLOBAL_PREVIOUS_FAILURE_STEPS:
-                    session_memory.pop(0)
+                # A repeated identical failure adds no information, only perception prompt tokens
+                if any(m["query"] == failure_memory["query"] and m["solution_summary"] == failure_memory["solution_summary"]
+                       for m in session_memory):
+                    logger.info("🔁 Skipping duplicate failure memory")
+                else:
+                    # Session-scoped only: a transient tool failure is not long-term memory for unrelated queries
+                    session_memory.append(failure_memory)
 
             live_update_session(session)
-            logger.info("\n🔁 [Post-Execution Step Summary]: \n%s", json.dumps(step.to_dict(), indent=2, ensure_ascii=False))
+            logger.info("\n🔁 [Post-Execution Step Summary]: \n%s", LazyJSON(step.to_dict()))
             return step
 
         elif step.type == "CONCLUDE":
-            logger.info(f"\n💡 Conclusion: {step.conclusion}")
+            logger.info("\n💡 Conclusion: %s", step.conclusion)
             step.execution_result = step.conclusion
-            step.status = "completed"
+            session.mark_step_completed(step)
 
-            perception_result = self.run_perception(
-                query=step.conclusion,
-                memory_results=session_memory,
-                current_plan=session.plan_versions[-1]["plan_text"],
-                snapshot_type="step_result"
-            )
-            logger.info("\n📋 [Post-Conclusion Perception Result]: \n%s", json.dumps(perception_result, indent=2, ensure_ascii=False))
-            step.perception = PerceptionSnapshot(**perception_result)
+            step.perception = self.conclusion_snapshot(step)
+            if step.perception is None:
+                # Persist the completed step in the background while perception checks the conclusion
+                live_update_session(session)
+                perception_result = await self.run_perception(
+                    query=step.conclusion,
+                    memory_results=session_memory,
+                    current_plan=session.current_plan_text,
+                    snapshot_type="step_result"
+                )
+                step.perception = PerceptionSnapshot(**perception_result)
+            logger.info("\n📋 [Post-Conclusion Perception Result]: \n%s", step.perception)
             session.mark_complete(step.perception, final_answer=step.conclusion)
             live_update_session(session)
+            await flush_session_updates()
             return None
 
         elif step.type == "NOP":
-            logger.info(f"\n❓ Clarification needed: {step.description}")
+            logger.info("\n❓ Clarification needed: %s", step.description)
             step.status = "clarification_needed"
             
             if self.human_intervention["enabled"]:
@@ -317,30 +564,34 @@ class AgentLoop:
                 )
             
                 # Add the intervention to the step
-                step.add_human_intervention(intervention)
+                session.add_human_intervention(step, intervention)
             
             # Update the session
             live_update_session(session)
             return None
 
     async def evaluate_step(self, step, session, query):
+        if step.perception.original_goal_achieved or not step.perception.local_goal_achieved:
+            self.discard_speculative_plan()
+
         if step.perception.original_goal_achieved:
             print("\n✅ Goal achieved.")
             session.mark_complete(step.perception)
             live_update_session(session)
+            await flush_session_updates()
             return None
         elif step.perception.local_goal_achieved:
             logger.info("\n✅ Local Goal achieved, planning next step.")
-            return self.get_next_step(session, query, step)
+            return await self.get_next_step(session, query, step)
         else:
             logger.info("\n🔁 Step unhelpful. Replanning.")
             
             # Check if we've exceeded max retries for this step
             if step.attempts >= self.max_lifelines:
-                logger.info(f"\n⚠️ Maximum retries ({self.max_lifelines}) reached for step {step.index}.")
+                logger.info("\n⚠️ Maximum retries (%d) reached for step %d.", self.max_lifelines, step.index)
                 conclusion_step = self.create_conclusion_step(
                     "Maximum retries reached",
-                    f"Step {step.index} failed after {step.attempts} attempts. Please try a different approach."
+                    _MAX_RETRIES_REACHED_CONCLUSION.format(index=step.index, attempts=step.attempts)
                 )
                 session.add_plan_version(
                     [f"Step {step.index}: Maximum retries reached"],
@@ -348,71 +599,43 @@ class AgentLoop:
                 )
                 session.state.update({
                     "original_goal_achieved": False,
-                    "final_answer": f"Step {step.index} failed after {step.attempts} attempts. Please try a different approach.",
+                    "final_answer": _MAX_RETRIES_REACHED_CONCLUSION.format(index=step.index, attempts=step.attempts),
                     "confidence": 0.8,
                     "reasoning_note": "Step retry limit reached",
-                    "solution_summary": f"Maximum retries ({self.max_lifelines}) reached for step {step.index}. Please try a different approach."
+                    "solution_summary": self._max_retries_summary.format(index=step.index)
                 })
                 live_update_session(session)
                 return None
 
             # Increment attempts counter
             step.attempts += 1
-            logger.info(f"\n🔄 Attempt {step.attempts} of {self.max_lifelines} for step {step.index}")
+            logger.info("\n🔄 Attempt %d of %d for step %d", step.attempts, self.max_lifelines, step.index)
 
             # Replan the step with human input
-            if self.human_intervention["enabled"]:
-                if step.attempts >= self.max_lifelines - 1:  # Last attempt
-                    logger.info(f"\n⚠️ Last attempt for step {step.index}, seeking human input before replanning")
-                
-                    # Use get_human_input with a special tool name for planning input
-                    intervention = await self.get_human_input(
-                        step=step,
-                        tool_name="planning_input_request",
-                        tool_args={
-                            "message": "Last attempt reached. Please provide guidance for replanning.",
-                            "type": "planning_input"
-                        },
-                        error="Planning input needed from user"
-                    )
-                
-                    # Add the intervention to the step
-                    step.add_human_intervention(intervention)
-                
-                    # Use the human input in the replanning decision
-                    decision_output = self.decision.run({
-                        "plan_mode": "mid_session",
-                        "planning_strategy": self.strategy,
-                        "original_query": query,
-                        "current_plan_version": len(session.plan_versions),
-                        "current_plan": session.plan_versions[-1]["plan_text"],
-                        "completed_steps": [s.to_dict() for s in session.plan_versions[-1]["steps"] if s.status == "completed"],
-                        "current_step": step.to_dict(),
-                        "human_input": intervention.human_input  # Add human input to decision context
-                    })
-                else:
-                    decision_output = self.decision.run({
-                        "plan_mode": "mid_session",
-                        "planning_strategy": self.strategy,
-                        "original_query": query,
-                        "current_plan_version": len(session.plan_versions),
-                        "current_plan": session.plan_versions[-1]["plan_text"],
-                        "completed_steps": [s.to_dict() for s in session.plan_versions[-1]["steps"] if s.status == "completed"],
-                        "current_step": step.to_dict()
-                    })
-            else:
-                decision_output = self.decision.run({
-                    "plan_mode": "mid_session",
-                    "planning_strategy": self.strategy,
-                    "original_query": query,
-                    "current_plan_version": len(session.plan_versions),
-                    "current_plan": session.plan_versions[-1]["plan_text"],
-                    "completed_steps": [s.to_dict() for s in session.plan_versions[-1]["steps"] if s.status == "completed"],
-                    "current_step": step.to_dict()
-                })
-            
+            human_input = None
+            if self.human_intervention["enabled"] and step.attempts >= self.max_lifelines - 1:  # Last attempt
+                logger.info("\n⚠️ Last attempt for step %d, seeking human input before replanning", step.index)
 
-            logger.info("\n📝 [Post-Replanning Decision Output]: \n%s", json.dumps(decision_output, indent=2, ensure_ascii=False))
+                # Use get_human_input with a special tool name for planning input
+                intervention = await self.get_human_input(
+                    step=step,
+                    tool_name="planning_input_request",
+                    tool_args={
+                        "message": "Last attempt reached. Please provide guidance for replanning.",
+                        "type": "planning_input"
+                    },
+                    error="Planning input needed from user"
+                )
+
+                # Add the intervention to the step
+                session.add_human_intervention(step, intervention)
+                human_input = intervention.human_input  # Add human input to decision context
+
+            decision_output = await self.run_decision(
+                self._build_decision_input("mid_session", query, session=session, step=step, human_input=human_input)
+            )
+
+            logger.info("\n📝 [Post-Replanning Decision Output]: \n%s", LazyJSON(decision_output))
 
             # Create new step with incremented attempts
             new_step = self.create_step(decision_output)
@@ -422,42 +645,76 @@ class AgentLoop:
 
             step = session.add_plan_version(decision_output["plan_text"], [new_step])
 
-            logger.info(f"\n📝 [Decision Plan Text: V{len(session.plan_versions)}]:")
-            for line in session.plan_versions[-1]["plan_text"]:
-                logger.info(f"  {line}")
+            logger.info("\n📝 [Decision Plan Text: V%d]:", len(session.plan_versions))
+            for line in session.current_plan_text:
+                logger.info("  %s", line)
 
             return step
 
-    def get_next_step(self, session, query, step):
+    async def get_next_step(self, session, query, step):
         next_index = step.index + 1
-        total_steps = len(session.plan_versions[-1]["plan_text"])
-        logger.info(f"\n🔄 [Next Step Index: {next_index}]")
-        logger.info(f"🔄 [Total Steps: {total_steps}]")
+        total_steps = len(session.current_plan_text)
+        logger.info("\n🔄 [Next Step Index: %d]", next_index)
+        logger.info("🔄 [Total Steps: %d]", total_steps)
         if next_index < total_steps:
-            decision_output = self.decision.run({
-                "plan_mode": "mid_session",
-                "planning_strategy": self.strategy,
-                "original_query": query,
-                "current_plan_version": len(session.plan_versions),
-                "current_plan": session.plan_versions[-1]["plan_text"],
-                "completed_steps": [s.to_dict() for s in session.plan_versions[-1]["steps"] if s.status == "completed"],
-                "current_step": step.to_dict()
-            })
-
-            logger.info("\n📝 [Post-Next-Step-Planning Decision Output]: \n%s", json.dumps(decision_output, indent=2, ensure_ascii=False))
+            decision_input = self._build_decision_input("mid_session", query, session=session, step=step)
+            decision_output = await self.consume_speculative_plan(session, step, decision_input)
+            if decision_output is None:
+                decision_output = await self.run_decision(decision_input)
+
+            logger.info("\n📝 [Post-Next-Step-Planning Decision Output]: \n%s", LazyJSON(decision_output))
 
             step = session.add_plan_version(decision_output["plan_text"], [self.create_step(decision_output)])
 
-            logger.info(f"\n📝 [Decision Plan Text: V{len(session.plan_versions)}]:")
-            for line in session.plan_versions[-1]["plan_text"]:
-                logger.info(f"  {line}")
+            logger.info("\n📝 [Decision Plan Text: V%d]:", len(session.plan_versions))
+            for line in session.current_plan_text:
+                logger.info("  %s", line)
 
             return step
 
         else:
+            self.discard_speculative_plan()
             logger.info("\n✅ No more steps.")
             return None
 
+    def start_speculative_plan(self, session, step):
+        """Plan the next step assuming the current one succeeds, overlapping decision with perception."""
+        self.discard_speculative_plan()
+        if step.index + 1 >= len(session.current_plan_text):
+            return
+        decision_input = self._build_decision_input("mid_session", session.original_query, session=session, step=step)
+        task = asyncio.create_task(self.run_decision(decision_input))
+        self.speculative_plan = (step.index, len(session.plan_versions), decision_input, task)
+
+    async def consume_speculative_plan(self, session, step, decision_input):
+        """The speculative decision, only if it was planned from exactly the input a synchronous plan would use."""
+        if self.speculative_plan is None:
+            return None
+        step_index, plan_version, speculative_input, task = self.speculative_plan
+        # Perception lands on the step after speculation started, so a plan made without it answers a different input
+        if step_index != step.index or plan_version != len(session.plan_versions) or speculative_input != decision_input:
+            self.discard_speculative_plan()
+            return None
+
+        self.speculative_plan = None
+        try:
+            decision_output = await task
+        except Exception as e:
+            logger.warning("⚠️ Speculative plan failed, planning synchronously: %s", e)
+            self.speculation_stats["misses"] += 1
+            return None
+
+        self.speculation_stats["hits"] += 1
+        logger.info("⚡ Using speculative plan (hits: %d, misses: %d)", self.speculation_stats["hits"], self.speculation_stats["misses"])
+        return decision_output
+
+    def discard_speculative_plan(self):
+        if self.speculative_plan is None:
+            return
+        self.speculative_plan[3].cancel()
+        self.speculative_plan = None
+        self.speculation_stats["misses"] += 1
+
     def create_conclusion_step(self, title: str, message: str) -> Step:
         """Create a conclusion step when max steps is reached."""
         return Step(
@@ -470,4 +727,6 @@ class AgentLoop:
 
     def set_human_input(self, input_text: str):
         """Method to be called by the UI/interface to provide human input"""
-        asyncio.create_task(self.human_input_queue.put(input_text))
\ No newline at end of file
+        if self.human_input_queue is None:
+            self.human_input_queue = asyncio.Queue()
+        self.human_input_queue.put_nowait(input_text)
\ No newline at end of file
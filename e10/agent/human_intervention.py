@@ -1,6 +1,6 @@
 # agent/human_intervention.py
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional, Dict, Any
 from config.log_config import setup_logging
@@ -9,7 +9,7 @@ from agent.exceptions import HumanInterventionError
 
 logger = setup_logging(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class HumanIntervention:
     """Data class to track human interventions in the agent workflow"""
     timestamp: datetime
@@ -22,10 +22,14 @@ class HumanIntervention:
     lifelines_remaining: int
     was_successful: bool = False
     next_step_decision: Optional[str] = None
+    _iso_cache: Optional[str] = field(default=None, init=False, repr=False, compare=False)
 
     def to_dict(self) -> dict:
+        # The timestamp never changes after creation, so format it once
+        if self._iso_cache is None:
+            self._iso_cache = self.timestamp.isoformat()
         return {
-            "timestamp": self.timestamp.isoformat(),
+            "timestamp": self._iso_cache,
             "step_index": self.step_index,
             "tool_name": self.tool_name,
             "tool_arguments": self.tool_arguments,
@@ -0,0 +1,141 @@
+import asyncio
+import inspect
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+from config.log_config import setup_logging
+
+logger = setup_logging(__name__)
+
+MAX_BATCH = 8
+MAX_WAIT_MS = 5
+
+
+class LLMBatcher:
+    """
+    Continuous batching for LLM calls.
+
+    Callers await `submit(payload)`; a background coroutine drains up to `max_batch` queued
+    payloads (waiting at most `max_wait_ms` for stragglers) and hands them to `dispatch` as one
+    batch. Batches are dispatched as independent tasks, so new requests keep being collected
+    while earlier batches are still in flight. One batcher is shared per key across the process,
+    so requests from different agents are coalesced; a key must therefore capture everything that
+    makes two dispatchers interchangeable (prompt, client settings), since a batch runs on whichever
+    of them called `shared` last. Dispatchers are held weakly, so the registry never keeps them alive.
+    """
+
+    _instances: Dict[Hashable, "LLMBatcher"] = {}
+
+    def __init__(self, dispatch: Callable[[List[Any]], Awaitable[List[Any]]], max_batch: int = MAX_BATCH, max_wait_ms: int = MAX_WAIT_MS):
+        self._dispatch_ref = self._weak(dispatch)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        self._inflight: Dict[asyncio.Task, list] = {}  # dispatch task -> its batch; keeps tasks referenced
+
+    @staticmethod
+    def _weak(dispatch: Callable) -> Callable[[], Callable | None]:
+        if inspect.ismethod(dispatch):
+            return weakref.WeakMethod(dispatch)
+        return lambda: dispatch  # plain functions own no instance worth freeing
+
+    @classmethod
+    def shared(cls, key: Hashable, dispatch: Callable[[List[Any]], Awaitable[List[Any]]], **kwargs) -> "LLMBatcher":
+        batcher = cls._instances.get(key)
+        if batcher is None:
+            batcher = cls._instances[key] = cls(dispatch, **kwargs)
+        else:
+            # The latest caller is alive at least until its own result arrives, so a batch always has a live dispatcher
+            batcher._dispatch_ref = cls._weak(dispatch)
+        return batcher
+
+    @classmethod
+    def close_all(cls) -> None:
+        for batcher in list(cls._instances.values()):
+            batcher.close()
+
+    def close(self) -> None:
+        """
+        Cancel the worker and in-flight batches and drop the batcher from the registry;
+        callers still awaiting a result get CancelledError.
+        """
+        for key, batcher in list(self._instances.items()):
+            if batcher is self:
+                del self._instances[key]
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for task, batch in list(self._inflight.items()):
+            task.cancel()
+            self._cancel_futures(batch)
+        self._inflight.clear()
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+
+    @staticmethod
+    def _cancel_futures(batch: list) -> None:
+        for _, future in batch:
+            if not future.done():
+                future.cancel()
+
+    async def submit(self, payload: Any) -> Any:
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((payload, future))
+        return await future
+
+    def _ensure_worker(self):
+        # Queues bind to the running loop, so (re)create them lazily on first use in each loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._drain())
+
+    async def _drain(self):
+        batch = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = self._loop.time() + self.max_wait
+                while len(batch) < self.max_batch:
+                    timeout = deadline - self._loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                if len(batch) > 1:
+                    logger.info("📦 Dispatching LLM batch of %d requests", len(batch))
+                task = self._loop.create_task(self._dispatch_batch(batch))
+                self._inflight[task] = batch
+                task.add_done_callback(self._forget)
+                batch = []
+        except asyncio.CancelledError:
+            self._cancel_futures(batch)
+            raise
+
+    def _forget(self, task: asyncio.Task) -> None:
+        self._inflight.pop(task, None)
+
+    async def _dispatch_batch(self, batch: list):
+        try:
+            dispatch = self._dispatch_ref()
+            if dispatch is None:
+                raise RuntimeError("LLMBatcher dispatcher was garbage-collected")
+            results = await dispatch([payload for payload, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"dispatch returned {len(results)} results for {len(batch)} requests")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -1,21 +1,20 @@
 import os
 import json
-import yaml
 import requests
 from pathlib import Path
 from google import genai
 from dotenv import load_dotenv
+from config.profiles import load_profiles
 
 load_dotenv()
 
 ROOT = Path(__file__).parent.parent
 MODELS_JSON = ROOT / "config" / "models.json"
-PROFILE_YAML = ROOT / "config" / "profiles.yaml"
 
 class ModelManager:
     def __init__(self):
         self.config = json.loads(MODELS_JSON.read_text())
-        self.profile = yaml.safe_load(PROFILE_YAML.read_text())
+        self.profile = load_profiles()
 
         self.text_model_key = self.profile["llm"]["text_generation"]
         self.model_info = self.config["models"][self.text_model_key]
@@ -1,8 +1,10 @@
 # agent/tool_simulation.py
 
+import itertools
 import random
+from types import MappingProxyType
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import List, Mapping, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,52 +15,52 @@ class FailureType:
     message: str
     probability: float
 
+# Returned when no failure types are configured
+_GENERIC_FAILURE = FailureType(type="generic", message="Simulated tool failure", probability=1.0)
+
 class ToolSimulation:
+    # Shared read-only responses, so the common no-failure path allocates nothing
+    _SUCCESS = MappingProxyType({"status": "success", "result": "Simulation disabled"})
+    _SIMULATED_SUCCESS = MappingProxyType({"status": "success", "result": "Simulation succeeded"})
+
     def __init__(self, config: dict):
         self.enabled = config.get("enabled", False)
         self.failure_rate = config.get("failure_rate", 0)  # Default to 0% failure rate
         self.failure_types = [
             FailureType(**ft) for ft in config.get("failure_types", [])
         ]
+        self._rng = random.Random()
+        # Cumulative distribution for get_failure, built once instead of re-summed on every call
+        self._cum_weights = list(itertools.accumulate(ft.probability for ft in self.failure_types))
+        self._total = self._cum_weights[-1] if self._cum_weights else 0
+        self._default_failure = self.failure_types[0] if self.failure_types else _GENERIC_FAILURE
         
     def should_fail(self) -> bool:
         """Determine if the current tool execution should fail based on failure rate"""
         if not self.enabled:
             return False
-        return random.random() * 100 < self.failure_rate
+        return self._rng.random() * 100 < self.failure_rate
         
     def get_failure(self) -> FailureType:
         """Get a random failure type based on probabilities"""
-        if not self.failure_types:
-            return FailureType(
-                type="generic",
-                message="Simulated tool failure",
-                probability=1.0
-            )
-            
-        # Normalize probabilities
-        total_prob = sum(ft.probability for ft in self.failure_types)
-        if total_prob == 0:
-            return self.failure_types[0]
-            
-        # Select failure type based on probability
-        r = random.random() * total_prob
-        cum_prob = 0
-        for ft in self.failure_types:
-            cum_prob += ft.probability
-            if r <= cum_prob:
-                return ft
-        return self.failure_types[-1]  # Fallback to last failure type
+        if self._total <= 0:
+            return self._default_failure
+
+        # Select failure type based on probability; cum_weights spares choices() re-accumulating them
+        return self._rng.choices(self.failure_types, cum_weights=self._cum_weights)[0]
 
-    def simulate_tool_execution(self, tool_name: str, tool_args: dict) -> dict:
-        """Simulate a tool execution with probability-based failure when enabled"""
+    def simulate_tool_execution(self, tool_name: str, tool_args: dict) -> Mapping:
+        """
+        Simulate a tool execution with probability-based failure when enabled.
+        The returned mapping is shared and read-only; copy it with dict() before modifying.
+        """
         if not self.enabled:
-            return {"status": "success", "result": "Simulation disabled"}
+            return ToolSimulation._SUCCESS
             
         # Check if this execution should fail based on failure rate
         if self.should_fail():
             failure = self.get_failure()
-            logger.info(f"🔧 Simulating {failure.type} failure for tool {tool_name}")
+            logger.info("🔧 Simulating %s failure for tool %s", failure.type, tool_name)
             raise Exception(f"Simulated {failure.type} error: {failure.message}")
             
-        return {"status": "success", "result": "Simulation succeeded"}
\ No newline at end of file
+        return ToolSimulation._SIMULATED_SUCCESS
\ No newline at end of file
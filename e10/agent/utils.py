@@ -1,6 +1,8 @@
-import asyncio
+from prompt_toolkit import PromptSession
 from agent.exceptions import HumanInterventionError
 
+_prompt_session = None  # created on first use, it grabs the terminal
+
 async def show_input_dialog(prompt: str) -> str:
     """Show an input dialog in the CLI and get user input.
     
@@ -15,12 +17,15 @@ async def show_input_dialog(prompt: str) -> str:
     print("="*80)
     print(prompt)
     print("="*80)
-    
+
+    global _prompt_session
+    if _prompt_session is None:
+        _prompt_session = PromptSession()
+
     while True:
         try:
-            # Use asyncio.get_event_loop().run_in_executor to handle input in a non-blocking way
-            loop = asyncio.get_event_loop()
-            user_input = await loop.run_in_executor(None, lambda: input("\nEnter your response (or 'cancel' to abort): ").strip())
+            # Awaited on the event loop instead of blocking an executor thread per prompt
+            user_input = (await _prompt_session.prompt_async("\nEnter your response (or 'cancel' to abort): ")).strip()
             
             if user_input.lower() == 'cancel':
                 raise HumanInterventionError("Human input was cancelled", "cancelled")
@@ -28,5 +33,5 @@ async def show_input_dialog(prompt: str) -> str:
                 print("Response cannot be empty. Please try again.")
                 continue
             return user_input
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, EOFError):
             raise HumanInterventionError("Human input was cancelled", "cancelled")
\ No newline at end of file
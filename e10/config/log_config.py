@@ -1,30 +1,79 @@
+import atexit
+import json
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_listener = None
+
 def setup_logging(module_name: str):
     """
-    Simple logging setup with both file and console output
+    Simple logging setup with both file and console output.
+    Records go through a queue and are written by a background listener thread,
+    so callers never block on file or console I/O.
     Args:
         module_name: Name of the module for log messages
     """
-    # Create logs directory if it doesn't exist
-    log_dir = Path(__file__).parent.parent / 'logs'
-    log_dir.mkdir(exist_ok=True)
-    
-    # Common log file path
-    log_file = log_dir / 'common.log'
-
-    # Format to include timestamp, level, module name, function name, line number
-    log_format = '%(asctime)s - %(levelname)s - %(module)s:%(funcName)s:%(lineno)d - %(message)s'
-    
-    logging.basicConfig(
-        level=logging.ERROR,
-        format=log_format,
-        handlers=[
+    global _listener
+    if _listener is None:
+        # Create logs directory if it doesn't exist
+        log_dir = Path(__file__).parent.parent / 'logs'
+        log_dir.mkdir(exist_ok=True)
+
+        # Common log file path
+        log_file = log_dir / 'common.log'
+
+        # Format to include timestamp, level, module name, function name, line number
+        log_format = '%(asctime)s - %(levelname)s - %(module)s:%(funcName)s:%(lineno)d - %(message)s'
+
+        handlers = [
             logging.FileHandler(log_file, mode='w', encoding='utf-8'),
             logging.StreamHandler(sys.stdout)
         ]
-    )
+        for handler in handlers:
+            handler.setFormatter(logging.Formatter(log_format))
+
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        # The listener's handlers apply the real format; the queue side only merges args into the message
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.setFormatter(logging.Formatter('%(message)s'))
+        logging.basicConfig(
+            level=logging.ERROR,
+            handlers=[queue_handler]
+        )
+
+    return logging.getLogger(module_name)
+
+
+def pretty_json(obj) -> str:
+    """
+    Indented JSON for log output. Uses orjson (several times faster on nested dicts) when installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=str).decode()
+    return json.dumps(obj, indent=2, ensure_ascii=False, default=str)
+
+
+class LazyJSON:
+    """
+    Log argument that defers pretty_json until a handler actually formats the record,
+    e.g. logger.info("Result: %s", LazyJSON(result)).
+    """
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
 
-    return logging.getLogger(module_name)
\ No newline at end of file
+    def __str__(self) -> str:
+        return pretty_json(self.obj)
@@ -0,0 +1,66 @@
+import copy
+import functools
+import os
+import pickle
+from pathlib import Path
+import yaml
+from config.log_config import setup_logging
+
+try:
+    from yaml import CSafeLoader as YamlLoader  # libyaml C bindings
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+logger = setup_logging(__name__)
+
+ROOT = Path(__file__).parent.parent
+PROFILE_YAML = ROOT / "config" / "profiles.yaml"
+MCP_SERVER_YAML = ROOT / "config" / "mcp_server_config.yaml"
+
+
+def load_profiles(path: Path = PROFILE_YAML) -> dict:
+    """Agent profiles (profiles.yaml), see load_yaml_config."""
+    return load_yaml_config(path)
+
+
+def load_yaml_config(path: Path) -> dict:
+    """
+    Load a config YAML, parsed once per process. Each caller gets its own deep copy, so
+    changing the returned dict never leaks into other callers' configuration.
+    """
+    return copy.deepcopy(_parse_yaml_config(Path(path)))
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_yaml_config(path: Path) -> dict:
+    """
+    Across processes the parsed dict is reused from a pickle sidecar until the YAML's mtime changes.
+    """
+    pickle_path = path.with_suffix(".pkl")
+    mtime = os.stat(path).st_mtime_ns
+    try:
+        with open(pickle_path, "rb") as f:
+            cached_mtime, config = pickle.load(f)
+        if cached_mtime == mtime:
+            return config
+    except Exception:
+        # Missing, stale or malformed sidecar (including pickles of an old shape): parse the YAML instead
+        pass
+
+    with open(path, "r") as f:
+        config = yaml.load(f, Loader=YamlLoader)
+
+    try:
+        tmp_path = pickle_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump((mtime, config), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, pickle_path)
+    except OSError as e:
+        logger.warning(f"⚠️ Could not write {pickle_path}: {e}")
+    return config
+
+
+@functools.lru_cache(maxsize=16)
+def load_prompt(path: str) -> str:
+    """Prompt template text, stripped; read once per process however many agents are built."""
+    return Path(path).read_text(encoding="utf-8").strip()
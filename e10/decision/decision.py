@@ -1,13 +1,19 @@
 import os
 import json
-from pathlib import Path
+import asyncio
 from dotenv import load_dotenv
 from google import genai
 from google.genai.errors import ServerError
 import re
 from mcp_servers.multiMCP import MultiMCP
 import ast
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
 from config.log_config import setup_logging
+from config.profiles import load_prompt
+from agent.llm_batcher import LLMBatcher
 
 logger = setup_logging(__name__)
 
@@ -16,24 +22,153 @@ load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
 client = genai.Client(api_key=api_key)
 
+DECISION_CACHE_SIZE = 64
+
+# Keys that change from call to call go last so consecutive prompts share the longest possible prefix
+VOLATILE_KEYS = ("human_input", "current_step")
+
 class Decision:
     def __init__(self, decision_prompt_path: str, multi_mcp: MultiMCP, api_key: str | None = None, model: str = "gemini-2.0-flash",  ):
         load_dotenv()
         self.decision_prompt_path = decision_prompt_path
         self.multi_mcp = multi_mcp
+        # Prompt files don't change while the agent runs; read and strip once per process
+        self.prompt_template = load_prompt(str(decision_prompt_path))
+        self._prompt_prefix_cache = None
 
         self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
             raise ValueError("GOOGLE_API_KEY not found in environment or explicitly provided.")
         self.client = genai.Client(api_key=self.api_key)
-        
+        self._cache_lock = threading.Lock()
+        self._response_cache: OrderedDict[str, dict] = OrderedDict()
+
+
+    async def run_async(self, decision_input: dict) -> dict:
+        """Run decision through the shared batcher so concurrent sessions are coalesced."""
+        # Instances with the same prompt and credentials are interchangeable, so pooled agents share one batcher
+        batcher = LLMBatcher.shared(("decision", self.decision_prompt_path, id(self.multi_mcp), self.api_key), self._dispatch_batch)
+        return await batcher.submit(decision_input)
+
+    async def _dispatch_batch(self, decision_inputs: list[dict]) -> list[dict]:
+        return await asyncio.to_thread(self.run_batch, decision_inputs)
+
+    @staticmethod
+    def _cache_key(decision_input: dict) -> str:
+        return hashlib.sha256(json.dumps(decision_input, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _cache_get(self, cache_key: str) -> dict | None:
+        with self._cache_lock:
+            if cache_key not in self._response_cache:
+                return None
+            self._response_cache.move_to_end(cache_key)
+            logger.info("⚡ Decision cache hit")
+            return copy.deepcopy(self._response_cache[cache_key])
+
+    def _cache_put(self, cache_key: str, output: dict) -> None:
+        if output.get("type") == "NOP":  # don't pin failures/overload responses
+            return
+        with self._cache_lock:
+            self._response_cache[cache_key] = copy.deepcopy(output)
+            if len(self._response_cache) > DECISION_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+
+    @staticmethod
+    def _stable_order(decision_input: dict) -> dict:
+        return {
+            **{k: v for k, v in decision_input.items() if k not in VOLATILE_KEYS},
+            **{k: decision_input[k] for k in VOLATILE_KEYS if k in decision_input}
+        }
+
+    def _prompt_prefix(self) -> str:
+        # Built on first use rather than in __init__, since MCP servers may be initialized after construction
+        if self._prompt_prefix_cache is None:
+            function_list_text = self.multi_mcp.tool_description_wrapper()
+            tool_descriptions = "\n".join(f"- `{desc.strip()}`" for desc in function_list_text)
+            tool_descriptions = "\n\n### The ONLY Available Tools\n\n---\n\n" + tool_descriptions
+            self._prompt_prefix_cache = f"{self.prompt_template}\n{tool_descriptions}"
+        return self._prompt_prefix_cache
+
+    @staticmethod
+    def _normalize_output(output: dict) -> dict:
+        # Handle flattened or nested format
+        if "next_step" in output:
+            output.update(output.pop("next_step"))
+
+        defaults = {
+            "step_index": 0,
+            "description": "Missing from LLM response",
+            "type": "NOP",
+            "code": "",
+            "conclusion": "",
+            "plan_text": ["Step 0: No valid plan returned by LLM."]
+        }
+        for key, default in defaults.items():
+            output.setdefault(key, default)
+        return output
+
+    def run_batch(self, decision_inputs: list[dict]) -> list[dict]:
+        """Run decision on several inputs with a single LLM call, rendering the shared prompt prefix once."""
+        cache_keys = [self._cache_key(d) for d in decision_inputs]
+        outputs = [self._cache_get(k) for k in cache_keys]
+        pending = [i for i, output in enumerate(outputs) if output is None]
+        if len(pending) <= 1:
+            for i in pending:
+                outputs[i] = self.run(decision_inputs[i])
+            return outputs
+
+        full_prompt = (
+            f"{self._prompt_prefix()}\n\n"
+            f"You are given {len(pending)} independent inputs. Plan for each one on its own and return a single JSON object "
+            f"of the form {{\"results\": [...]}} holding one decision object per input. Each object must repeat its input's "
+            f"\"batch_index\" field unchanged.\n\n"
+            f"```json\n{json.dumps([{**self._stable_order(decision_inputs[i]), 'batch_index': i} for i in pending], indent=2)}\n```"
+        )
+
+        try:
+            response = self.client.models.generate_content(
+                model="gemini-2.0-flash",
+                contents=full_prompt
+            )
+            raw_text = response.candidates[0].content.parts[0].text.strip()
+            json_block = raw_text.split("```json")[1].split("```")[0].strip()
+            results = json.loads(json_block)["results"]
+        except Exception as e:
+            logger.warning(f"⚠️ Batched decision failed ({e}), falling back to one call per input")
+            for i in pending:
+                outputs[i] = self.run(decision_inputs[i])
+            return outputs
+
+        # Matched on the echoed batch_index rather than position, so a dropped or reordered
+        # object can't hand one session's plan to another
+        by_index = {}
+        for output in results:
+            if isinstance(output, dict) and "batch_index" in output:
+                by_index.setdefault(str(output.pop("batch_index")), output)
+
+        for i in pending:
+            output = by_index.get(str(i))
+            if output is None:
+                logger.warning(f"⚠️ Batched decision returned no result for input {i}, retrying it alone")
+                outputs[i] = self.run(decision_inputs[i])
+                continue
+            outputs[i] = self._normalize_output(output)
+            self._cache_put(cache_keys[i], outputs[i])
+        return outputs
 
     def run(self, decision_input: dict) -> dict:
-        prompt_template = Path(self.decision_prompt_path).read_text(encoding="utf-8")
-        function_list_text = self.multi_mcp.tool_description_wrapper()
-        tool_descriptions = "\n".join(f"- `{desc.strip()}`" for desc in function_list_text)
-        tool_descriptions = "\n\n### The ONLY Available Tools\n\n---\n\n" + tool_descriptions
-        full_prompt = f"{prompt_template.strip()}\n{tool_descriptions}\n\n```json\n{json.dumps(decision_input, indent=2)}\n```"
+        """Run decision, answering identical re-plans (e.g. the agent looping on the same failure) from a local LRU."""
+        cache_key = self._cache_key(decision_input)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        output = self._run_llm(decision_input)
+        self._cache_put(cache_key, output)
+        return output
+
+    def _run_llm(self, decision_input: dict) -> dict:
+        full_prompt = f"{self._prompt_prefix()}\n\n```json\n{json.dumps(self._stable_order(decision_input), indent=2)}\n```"
 
         #logger.info(f"🔍 Decision Prompt: {full_prompt}")
 
@@ -83,22 +218,7 @@ class Decision:
                     "raw_text": raw_text[:1000]
                 }
 
-            # Handle flattened or nested format
-            if "next_step" in output:
-                output.update(output.pop("next_step"))
-
-            defaults = {
-                "step_index": 0,
-                "description": "Missing from LLM response",
-                "type": "NOP",
-                "code": "",
-                "conclusion": "",
-                "plan_text": ["Step 0: No valid plan returned by LLM."]
-            }
-            for key, default in defaults.items():
-                output.setdefault(key, default)
-
-            return output
+            return self._normalize_output(output)
 
         except Exception as e:
             import pdb; pdb.set_trace()
@@ -1,11 +1,12 @@
 import asyncio
-import yaml
+from prompt_toolkit import PromptSession
 from mcp_servers.multiMCP import MultiMCP
 from agent.agent_loop2 import AgentLoop
 from agent.agentSession import Step
 from pprint import pprint
 from agent.exceptions import HumanInterventionError
 from agent.utils import show_input_dialog
+from config.profiles import MCP_SERVER_YAML, load_yaml_config
 
 BANNER = """
 ──────────────────────────────────────────────────────
@@ -19,10 +20,9 @@ Type 'exit' or 'quit' to leave.
 async def interactive() -> None:
     print(BANNER)
     print("Loading MCP Servers...")
-    with open("config/mcp_server_config.yaml", "r") as f:
-        profile = yaml.safe_load(f)
-        mcp_servers_list = profile.get("mcp_servers", [])
-        configs = list(mcp_servers_list)
+    profile = load_yaml_config(MCP_SERVER_YAML)
+    mcp_servers_list = profile.get("mcp_servers", [])
+    configs = list(mcp_servers_list)
 
     # Initialize MCP + Dispatcher
     multi_mcp = MultiMCP(server_configs=configs)
@@ -33,9 +33,11 @@ async def interactive() -> None:
         multi_mcp=multi_mcp,
         strategy="exploratory"
     )
+    # Awaited prompts keep the event loop (and the MCP sessions on it) running while waiting for the user
+    prompt_session = PromptSession()
     while True:
 
-        query = input("🟢  You: ").strip()
+        query = (await prompt_session.prompt_async("🟢  You: ")).strip()
         if query.lower() in {"exit", "quit"}:
             print("👋  Goodbye!")
             break
@@ -46,7 +48,7 @@ async def interactive() -> None:
         # pprint(f"🔵  Agent: {response.state['final_answer']}\n {response.state['reasoning_note']}\n")
         print(f"🔵 Agent: {response.state['solution_summary']}\n")
 
-        follow = input("\n\nContinue? (press Enter) or type 'exit': ").strip()
+        follow = (await prompt_session.prompt_async("\n\nContinue? (press Enter) or type 'exit': ")).strip()
         if follow.lower() in {"exit", "quit"}:
             print("👋  Goodbye!")
             break
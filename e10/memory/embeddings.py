@@ -0,0 +1,99 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import requests
+import numpy as np
+from config.log_config import setup_logging
+
+logger = setup_logging(__name__)
+
+EMBED_URL = "http://localhost:11434/api/embeddings"
+EMBED_BATCH_URL = "http://localhost:11434/api/embed"
+EMBED_MODEL = "nomic-embed-text"
+EMBED_CACHE_SIZE = 4096
+
+
+def get_embedding(text: str) -> np.ndarray | None:
+    """
+    Embed text with the local nomic model, L2-normalized so that inner product equals cosine similarity.
+    Returns None when the embedding service is unreachable so callers can simply skip caching.
+    """
+    try:
+        result = requests.post(EMBED_URL, json={"model": EMBED_MODEL, "prompt": text}, timeout=10)
+        result.raise_for_status()
+    except requests.RequestException as e:
+        logger.warning(f"⚠️ Embedding service unavailable: {e}")
+        return None
+
+    embedding = np.array(result.json()["embedding"], dtype=np.float32)
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm else embedding
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU of text embeddings keyed by the SHA-256 of the text, with an optional TTL in seconds.
+    Failed embeddings (None) are never cached, so they are retried on the next call.
+    """
+
+    def __init__(self, max_size: int = EMBED_CACHE_SIZE, ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, embedding: np.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), embedding)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_embedding_cache = EmbeddingCache()
+
+
+def embed_with_cache(text: str) -> np.ndarray | None:
+    """
+    get_embedding() behind the process-wide EmbeddingCache, so identical texts are embedded once.
+    The returned array is shared between callers and must not be modified in place.
+    """
+    key = EmbeddingCache.key(text)
+    embedding = _embedding_cache.get(key)
+    if embedding is None:
+        embedding = get_embedding(text)
+        if embedding is not None:
+            _embedding_cache.put(key, embedding)
+    return embedding
+
+
+def get_embeddings(texts: list[str]) -> np.ndarray | None:
+    """
+    Embed several texts in one request. Returns an (n, dim) array of L2-normalized rows, or None on failure.
+    """
+    try:
+        result = requests.post(EMBED_BATCH_URL, json={"model": EMBED_MODEL, "input": texts}, timeout=60)
+        result.raise_for_status()
+    except requests.RequestException as e:
+        logger.warning(f"⚠️ Embedding service unavailable: {e}")
+        return None
+
+    embeddings = np.array(result.json()["embeddings"], dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
@@ -1,59 +1,311 @@
 import os
+import re
 import json
+import sqlite3
+import time
+import functools
+import threading
+import numpy as np
 from pathlib import Path
-from typing import List, Dict
-from rapidfuzz import fuzz
+from typing import List, Dict, Tuple
+from rapidfuzz import fuzz, process
 from config.log_config import setup_logging
+from memory.embeddings import embed_with_cache, get_embeddings
+from memory.session_log import bump_memory_version
 
 logger = setup_logging(__name__)
 
+VECTOR_MIN_ENTRIES = 256  # below this a full fuzzy scan is cheaper than embedding the query
+VECTOR_CANDIDATES = 3     # each lane contributes its top_k * VECTOR_CANDIDATES entries
+RRF_K = 60                # reciprocal rank fusion constant
+VECTOR_RETRY_BACKOFF = 30.0  # seconds before retrying a vector index build whose embeddings failed; doubles per failure
+VECTOR_RETRY_MAX = 600.0
+
 class MemorySearch:
-    def __init__(self, logs_path: str = "memory/session_logs"):
+    def __init__(self, logs_path: str = "memory/session_logs", use_vectors: bool = True):
         self.logs_path = Path(logs_path)
+        self.use_vectors = use_vectors
+        self._lock = threading.Lock()
+        self._file_cache: Dict[Path, Tuple[float, List[Dict]]] = {}  # path -> (mtime, entries)
+
+        # Structure-of-arrays view of the entries so scoring is one vectorized pass
+        self._entries: List[Dict] = []
+        self._queries: List[str] = []
+        self._summaries: List[str] = []
+        self._length_penalties = np.empty(0, dtype=np.float32)
+        self._added: List[Dict] = []  # records inserted with add(), kept across re-indexing
+
+        # Vector lane: entry embeddings are computed once per (query, summary) and stacked into a row-per-entry
+        # matrix; at memory sizes an exact matmul beats an ANN index. Capacity doubles so appends are amortized O(1)
+        self._entry_embeddings: Dict[Tuple[str, str], np.ndarray] = {}
+        self._emb_matrix: np.ndarray | None = None  # [capacity, dim] float32, L2-normalized; rows past _emb_count unused
+        self._emb_count = 0
+        self._vector_dirty = True
+        self._vector_retry_at = 0.0  # time.monotonic() before which a failed build is not retried
+        self._vector_backoff = VECTOR_RETRY_BACKOFF
+
+        # Lexical lane: FTS5/BM25 over query and summary text, so exact identifiers are not missed
+        self._fts = None
+        self._fts_dirty = True
 
     def search_memory(self, user_query: str, top_k: int = 3) -> List[Dict]:
-        memory_entries = self._load_queries()
-        scored_results = []
+        query_embedding = self._prepare(user_query)
+        with self._lock:
+            if not self._entries:
+                return []
+
+            depth = top_k * VECTOR_CANDIDATES
+            semantic = self._semantic_ranking(user_query, depth, query_embedding)
+            lexical = self._lexical_ranking(user_query, depth)
+            if not lexical:
+                return [self._entries[i] for i in semantic[:top_k]]
+
+            # Reciprocal rank fusion; ties keep the semantic lane's order
+            fused: Dict[int, float] = {}
+            for ranking in (semantic, lexical):
+                for rank, i in enumerate(ranking):
+                    fused[i] = fused.get(i, 0.0) + 1 / (RRF_K + rank)
+            top_matches = sorted(fused, key=fused.get, reverse=True)[:top_k]
+            return [self._entries[i] for i in top_matches]
+
+    def _prepare(self, user_query: str) -> np.ndarray | None:
+        """
+        Refresh the entries and fetch the embeddings the vector lane needs; returns the query embedding,
+        or None when the vector lane is not used. Embedding requests are HTTP round trips, so the lock is
+        held only to read what is missing and to publish the results, never across a request.
+        """
+        with self._lock:
+            self._refresh()
+            use_vectors = (self.use_vectors and len(self._entries) >= VECTOR_MIN_ENTRIES
+                           and time.monotonic() >= self._vector_retry_at)
+            missing = self._missing_embedding_keys() if use_vectors and self._vector_dirty else []
+        if not use_vectors:
+            return None
+
+        if missing:
+            embeddings = get_embeddings([f"{query} | {summary}" for query, summary in missing])
+            with self._lock:
+                if embeddings is None:
+                    self._schedule_vector_retry()
+                    return None
+                self._entry_embeddings.update(zip(missing, embeddings))
+                self._vector_backoff = VECTOR_RETRY_BACKOFF
+        return embed_with_cache(user_query)
+
+    def _missing_embedding_keys(self) -> List[Tuple[str, str]]:
+        return list({
+            key for key in ((entry["query"], entry["solution_summary"]) for entry in self._entries)
+            if key not in self._entry_embeddings
+        })
+
+    def add(self, record: Dict) -> None:
+        """
+        Insert a live record without re-indexing: the entry is appended to the arrays and streamed
+        into the FTS5 table, and into the embedding matrix once the next search has embedded it.
+        """
+        entry = {
+            "file": record.get("file", "<live>"),
+            "query": record["query"],
+            "result_requirement": record["result_requirement"],
+            "solution_summary": record["solution_summary"]
+        }
+        with self._lock:
+            if any(e["query"] == entry["query"] and e["solution_summary"] == entry["solution_summary"] for e in self._added):
+                return
+            self._added.append(entry)
+            self._append_entries([entry])
+        # Cached search results (e.g. AgentLoop's memory caches) predate this entry
+        bump_memory_version()
+
+    def _append_entries(self, entries: List[Dict]) -> None:
+        start = len(self._entries)
+        self._entries.extend(entries)
+        self._queries.extend(entry["query"].lower() for entry in entries)
+        self._summaries.extend(entry["solution_summary"].lower() for entry in entries)
+        self._length_penalties = np.concatenate([
+            self._length_penalties,
+            np.array([len(entry["solution_summary"]) / 100 for entry in entries], dtype=np.float32)
+        ])
+
+        if self._fts is not None and not self._fts_dirty:
+            self._fts.executemany(
+                "INSERT INTO memory_fts(rowid, query, solution_summary) VALUES (?, ?, ?)",
+                ((start + i, entry["query"], entry["solution_summary"]) for i, entry in enumerate(entries))
+            )
+
+        if self._emb_matrix is not None and not self._vector_dirty:
+            # Matrix rows line up with entry positions
+            keys = [(entry["query"], entry["solution_summary"]) for entry in entries]
+            if all(key in self._entry_embeddings for key in keys):
+                self._append_vectors(np.stack([self._entry_embeddings[key] for key in keys]))
+            else:
+                self._vector_dirty = True  # the next search embeds them outside the lock and rebuilds
+
+    def _append_vectors(self, vectors: np.ndarray) -> None:
+        needed = self._emb_count + len(vectors)
+        if needed > len(self._emb_matrix):
+            grown = np.empty((max(needed, 2 * len(self._emb_matrix)), self._emb_matrix.shape[1]), dtype=np.float32)
+            grown[:self._emb_count] = self._emb_matrix[:self._emb_count]
+            self._emb_matrix = grown
+        self._emb_matrix[self._emb_count:needed] = vectors
+        self._emb_count = needed
+
+    def _semantic_ranking(self, user_query: str, depth: int, query_embedding: np.ndarray | None) -> List[int]:
+        """Entry positions ranked by the fuzzy score, over vector-lane candidates when available, else all entries."""
+        candidates = self._vector_candidates(query_embedding, depth)
+        if candidates is None:
+            queries, summaries, penalties = self._queries, self._summaries, self._length_penalties
+        else:
+            queries = [self._queries[i] for i in candidates]
+            summaries = [self._summaries[i] for i in candidates]
+            penalties = self._length_penalties[candidates]
+
+        user_query = user_query.lower()
+        query_scores = process.cdist([user_query], queries, scorer=fuzz.partial_ratio, dtype=np.float32)[0]
+        summary_scores = process.cdist([user_query], summaries, scorer=fuzz.partial_ratio, dtype=np.float32)[0]
+        scores = 0.5 * query_scores + 0.4 * summary_scores - 0.05 * penalties
+
+        ranking = np.argsort(-scores, kind="stable")[:depth]
+        if candidates is not None:
+            ranking = candidates[ranking]
+        return ranking.tolist()
+
+    def _lexical_ranking(self, user_query: str, depth: int) -> List[int]:
+        """Entry positions ranked by BM25, or [] when the query has no terms or FTS5 is unavailable."""
+        terms = re.findall(r"\w+", user_query.lower())
+        if not terms:
+            return []
+        if self._fts_dirty:
+            self._build_fts_index()
+        if self._fts is None:
+            return []
+
+        match = " OR ".join(f'"{term}"' for term in terms)
+        rows = self._fts.execute(
+            "SELECT rowid FROM memory_fts WHERE memory_fts MATCH ? ORDER BY bm25(memory_fts) LIMIT ?",
+            (match, depth)
+        ).fetchall()
+        return [rowid for (rowid,) in rows]
 
-        for entry in memory_entries:
-            query_score = fuzz.partial_ratio(user_query.lower(), entry["query"].lower())
-            summary_score = fuzz.partial_ratio(user_query.lower(), entry["solution_summary"].lower())
-            length_penalty = len(entry["solution_summary"]) / 100
-            score = 0.5 * query_score + 0.4 * summary_score - 0.05 * length_penalty
-            scored_results.append((score, entry))
+    def _build_fts_index(self) -> None:
+        self._fts_dirty = False
+        try:
+            if self._fts is None:
+                self._fts = sqlite3.connect(":memory:", check_same_thread=False)  # guarded by self._lock
+                self._fts.execute("CREATE VIRTUAL TABLE memory_fts USING fts5(query, solution_summary)")
+            self._fts.execute("DELETE FROM memory_fts")
+            self._fts.executemany(
+                "INSERT INTO memory_fts(rowid, query, solution_summary) VALUES (?, ?, ?)",
+                ((i, entry["query"], entry["solution_summary"]) for i, entry in enumerate(self._entries))
+            )
+        except sqlite3.OperationalError as e:
+            logger.warning(f"⚠️ FTS5 unavailable, memory search falls back to fuzzy/vector only: {e}")
+            self._fts = None
+
+    def _vector_candidates(self, query_embedding: np.ndarray | None, k: int) -> np.ndarray | None:
+        """Entry positions nearest to the query by embedding, or None to fall back to a full scan."""
+        if query_embedding is None or len(self._entries) < max(VECTOR_MIN_ENTRIES, k):
+            return None
+        if self._vector_dirty:
+            self._build_vector_index()
+        if self._emb_matrix is None:
+            return None
+
+        scores = self._emb_matrix[:self._emb_count] @ query_embedding
+        if k >= len(scores):
+            return np.argsort(-scores, kind="stable")
+        top = np.argpartition(-scores, k)[:k]
+        return top[np.argsort(-scores[top], kind="stable")]
 
-        top_matches = sorted(scored_results, key=lambda x: x[0], reverse=True)[:top_k]
-        return [match[1] for match in top_matches]
+    def _build_vector_index(self) -> None:
+        """Stack the embeddings fetched by _prepare; stays dirty if entries arrived since then."""
+        self._emb_matrix = None
+        self._emb_count = 0
+
+        keys = [(entry["query"], entry["solution_summary"]) for entry in self._entries]
+        if any(key not in self._entry_embeddings for key in keys):
+            return  # embedded by the next search's _prepare
+        self._emb_matrix = np.stack([self._entry_embeddings[key] for key in keys]).astype(np.float32, copy=False)
+        self._emb_count = len(keys)
+        self._vector_dirty = False
+
+    def _schedule_vector_retry(self) -> None:
+        """Embedding failed (e.g. Ollama unreachable): keep the index dirty and back off before the next build."""
+        self._vector_dirty = True
+        self._vector_retry_at = time.monotonic() + self._vector_backoff
+        self._vector_backoff = min(2 * self._vector_backoff, VECTOR_RETRY_MAX)
 
     def _load_queries(self) -> List[Dict]:
-        memory_entries = []
+        with self._lock:
+            self._refresh()
+            return list(self._entries)
+
+    def _refresh(self) -> None:
+        """Re-parse only session files that are new or changed since the last call."""
         all_json_files = list(self.logs_path.rglob("*.json"))
-        logger.info(f"🔍 Found {len(all_json_files)} JSON file(s) in '{self.logs_path}'")
+        seen = set()
+        changed = False
+        appended = []  # entries of new files, or of files that had none before
+        rebuild = False
 
         for file in all_json_files:
-            count_before = len(memory_entries)
+            seen.add(file)
             try:
-                with open(file, 'r', encoding='utf-8') as f:
-                    content = json.load(f)
-
-                if isinstance(content, list):  # FORMAT 1
-                    for session in content:
-                        self._extract_entry(session, file.name, memory_entries)
-                elif isinstance(content, dict) and "session_id" in content:  # FORMAT 2
-                    self._extract_entry(content, file.name, memory_entries)
-                elif isinstance(content, dict) and "turns" in content:  # FORMAT 3
-                    for turn in content["turns"]:
-                        self._extract_entry(turn, file.name, memory_entries)
-
-            except Exception as e:
-                logger.warning(f"⚠️ Skipping '{file}': {e}")
+                mtime = os.stat(file).st_mtime
+            except OSError:
+                continue
+            cached = self._file_cache.get(file)
+            if cached and cached[0] == mtime:
                 continue
+            entries = self._load_file(file)
+            self._file_cache[file] = (mtime, entries)
+            changed = True
+            if cached and cached[1]:
+                rebuild = rebuild or cached[1] != entries
+            else:
+                appended.extend(entries)
 
-            count_after = len(memory_entries)
-            if count_after > count_before:
-                logger.info(f"✅ {file.name}: {count_after - count_before} matching entries")
+        for file in set(self._file_cache) - seen:
+            rebuild = rebuild or bool(self._file_cache[file][1])
+            del self._file_cache[file]
+            changed = True
 
-        print(f"📦 Total usable memory entries collected: {len(memory_entries)}\n")
+        if rebuild:
+            self._entries = [entry for _, entries in self._file_cache.values() for entry in entries] + self._added
+            self._queries = [entry["query"].lower() for entry in self._entries]
+            self._summaries = [entry["solution_summary"].lower() for entry in self._entries]
+            self._length_penalties = np.array([len(entry["solution_summary"]) / 100 for entry in self._entries], dtype=np.float32)
+            self._vector_dirty = True
+            self._fts_dirty = True
+        elif appended:
+            # Live-updated sessions only ever gain entries, so stream them in instead of re-indexing
+            self._append_entries(appended)
+
+        if changed:
+            logger.info("🔍 Indexed %d JSON file(s) in '%s'", len(all_json_files), self.logs_path)
+            print(f"📦 Total usable memory entries collected: {len(self._entries)}\n")
+
+    def _load_file(self, file: Path) -> List[Dict]:
+        memory_entries = []
+        try:
+            with open(file, 'r', encoding='utf-8') as f:
+                content = json.load(f)
+
+            if isinstance(content, list):  # FORMAT 1
+                for session in content:
+                    self._extract_entry(session, file.name, memory_entries)
+            elif isinstance(content, dict) and "session_id" in content:  # FORMAT 2
+                self._extract_entry(content, file.name, memory_entries)
+            elif isinstance(content, dict) and "turns" in content:  # FORMAT 3
+                for turn in content["turns"]:
+                    self._extract_entry(turn, file.name, memory_entries)
+
+        except Exception as e:
+            logger.warning(f"⚠️ Skipping '{file}': {e}")
+            return memory_entries
+
+        if memory_entries:
+            logger.info("✅ %s: %d matching entries", file.name, len(memory_entries))
         return memory_entries
 
     def _extract_entry(self, obj: dict, file_name: str, memory_entries: List[Dict]):
@@ -98,7 +350,7 @@ class MemorySearch:
         try:
             match = recursive_find(obj)
             if match and match["query"]:
-                logger.info(f"✅ Extracted: {match['query'][:40]} → {match['summary'][:40]}")
+                logger.info("✅ Extracted: %s → %s", match["query"][:40], match["summary"][:40])
                 memory_entries.append({
                     "file": file_name,
                     "query": match["query"],
@@ -109,8 +361,14 @@ class MemorySearch:
             logger.error(f"❌ Error parsing {file_name}: {e}")
 
 
+@functools.lru_cache(maxsize=1)
+def get_memory_search(logs_path: str = "memory/session_logs") -> MemorySearch:
+    """Process-wide MemorySearch, so parsed session files are shared by every AgentLoop."""
+    return MemorySearch(logs_path)
+
+
 if __name__ == "__main__":
-    searcher = MemorySearch()
+    searcher = get_memory_search()
     query = input("Enter your query: ").strip()
     results = searcher.search_memory(query)
 
@@ -119,4 +377,5 @@ if __name__ == "__main__":
     else:
         logger.info("\n🎯 Top Matches:\n")
         for i, res in enumerate(results, 1):
-            logger.info(f"[{i}] File: {res['file']}\nQuery: {res['query']}\nResult Requirement: {res['result_requirement']}\nSummary: {res['solution_summary']}\n")
+            logger.info("[%d] File: %s\nQuery: %s\nResult Requirement: %s\nSummary: %s\n",
+                        i, res["file"], res["query"], res["result_requirement"], res["solution_summary"])
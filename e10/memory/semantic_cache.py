@@ -0,0 +1,139 @@
+import faiss
+import numpy as np
+from typing import Any, Optional, Tuple
+from config.log_config import setup_logging
+
+logger = setup_logging(__name__)
+
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+QUANTIZE_AFTER = 1024  # entries kept as float32 before switching the index to int8 codes
+
+
+class QVCache:
+    """
+    Semantic cache keyed by normalized embeddings, with QVCache-style adaptive thresholds.
+
+    Cached keys are grouped into regions with online mini-batch k-means and every region learns
+    its own cosine-similarity threshold instead of sharing one global constant.
+
+    Keys live in an inner-product HNSW graph (O(log n) search). Once the cache holds
+    `quantize_after` entries the index is rebuilt once over int8 scalar-quantized vectors,
+    cutting key storage by 4x; later keys are quantized on insert.
+    """
+
+    def __init__(self, threshold: float = 0.92, n_clusters: int = 64, margin: float = 0.01, min_threshold: float = 0.85,
+                 quantize_after: int = QUANTIZE_AFTER):
+        self.base_threshold = threshold
+        self.n_clusters = n_clusters
+        self.margin = margin
+        self.min_threshold = min(min_threshold, threshold)
+        self.quantize_after = quantize_after
+        self.quantized = False
+
+        self.index: Optional[faiss.IndexHNSW] = None
+        self.values: list[Any] = []
+        self.fingerprints: list[Any] = []
+
+        self.centroids: Optional[np.ndarray] = None
+        self.cluster_counts: list[int] = []
+        self.cluster_thresholds: list[float] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _nearest(self, embedding: np.ndarray) -> Tuple[float, int]:
+        scores, ids = self.index.search(embedding.reshape(1, -1), 1)
+        return float(scores[0][0]), int(ids[0][0])
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        # Inner product only equals cosine similarity on unit vectors
+        embedding = embedding.astype(np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _new_index(self, dim: int, vectors: Optional[np.ndarray] = None) -> faiss.IndexHNSW:
+        if vectors is None:
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit_uniform, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            index.add(vectors)
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+
+    def _quantize(self) -> None:
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        self.index = self._new_index(vectors.shape[1], vectors)
+        self.quantized = True
+        logger.info("🗜️ Semantic cache quantized to int8 at %d entries", self.index.ntotal)
+
+    def _nearest_cluster(self, embedding: np.ndarray) -> Tuple[float, int]:
+        if self.centroids is None:
+            return -1.0, -1
+        similarities = self.centroids @ embedding
+        cluster = int(np.argmax(similarities))
+        return float(similarities[cluster]), cluster
+
+    def _assign_cluster(self, embedding: np.ndarray) -> int:
+        similarity, cluster = self._nearest_cluster(embedding)
+
+        # Open a new region while there is room and nothing close enough exists
+        if cluster < 0 or (len(self.cluster_counts) < self.n_clusters and similarity < self.base_threshold):
+            centroid = embedding.reshape(1, -1)
+            self.centroids = centroid.copy() if self.centroids is None else np.vstack([self.centroids, centroid])
+            self.cluster_counts.append(1)
+            self.cluster_thresholds.append(self.base_threshold)
+            return len(self.cluster_counts) - 1
+
+        # Mini-batch k-means update with a per-centre learning rate of 1 / count
+        self.cluster_counts[cluster] += 1
+        centroid = self.centroids[cluster] + (embedding - self.centroids[cluster]) / self.cluster_counts[cluster]
+        norm = np.linalg.norm(centroid)
+        self.centroids[cluster] = centroid / norm if norm else centroid
+        return cluster
+
+    def lookup(self, embedding: Optional[np.ndarray]) -> Optional[Tuple[float, Any]]:
+        if embedding is None or self.index is None or self.index.ntotal == 0:
+            return None
+
+        embedding = self._normalize(embedding)
+        score, idx = self._nearest(embedding)
+        _, cluster = self._nearest_cluster(embedding)
+        threshold = self.cluster_thresholds[cluster]
+        if idx < 0 or score < threshold:
+            logger.info("🔎 Semantic cache miss (best score %.3f < %.3f)", score, threshold)
+            return None
+
+        logger.info("⚡ Semantic cache hit (score %.3f >= %.3f)", score, threshold)
+        return score, self.values[idx]
+
+    def add(self, embedding: Optional[np.ndarray], value: Any, fingerprint: Any = None) -> None:
+        """
+        Insert a value. `fingerprint` identifies equivalent answers (defaults to the value itself);
+        it drives the region's threshold: raised to exclude a differing nearest neighbour,
+        relaxed towards an equivalent one that the current threshold would have missed.
+        """
+        if embedding is None:
+            return
+        embedding = self._normalize(embedding)
+        fingerprint = value if fingerprint is None else fingerprint
+
+        cluster = self._assign_cluster(embedding)
+        if self.index is None:
+            self.index = self._new_index(embedding.shape[0])
+        elif self.index.ntotal:
+            score, idx = self._nearest(embedding)
+            threshold = self.cluster_thresholds[cluster]
+            if self.fingerprints[idx] != fingerprint:
+                threshold = max(threshold, min(1.0, score + self.margin))
+            elif score < threshold:
+                threshold = max(self.min_threshold, (threshold + score) / 2)
+            self.cluster_thresholds[cluster] = threshold
+
+        self.index.add(embedding.reshape(1, -1))
+        self.values.append(value)
+        self.fingerprints.append(fingerprint)
+        if not self.quantized and self.index.ntotal >= self.quantize_after:
+            self._quantize()
@@ -1,20 +1,70 @@
+import os
 import json
+import asyncio
+import threading
 from pathlib import Path
 from datetime import datetime
 from config.log_config import setup_logging
 from typing import Dict, List, Optional, Tuple
+from collections import Counter
 import re
 
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
 logger = setup_logging(__name__)
 
+_loads = orjson.loads if orjson is not None else json.loads
+
+# Bumped whenever a session that memory search can pick up is written, or a record is added to it live
+_memory_version = 0
+_memory_version_lock = threading.Lock()
+
+# Minimum gap between two background flushes of pending session updates
+SESSION_WRITE_INTERVAL = 0.1
+
+# Session files read at once by load_sessions
+SESSION_LOAD_CONCURRENCY = 16
+
+# session_id -> (session_obj, base_dir); only the latest update per session is kept
+_pending_updates: Dict[str, Tuple[object, str]] = {}
+_writer_loop = None
+_writer_task = None
+_writer_wakeup = None
+_write_lock = None
+_unsynced_paths: set = set()  # written by the background writer but not fsynced yet
+_ensured_dirs: set = set()  # day directories already created by get_store_path
+
+_TOOL_CALL_RE = re.compile(r'(\w+)\s*\(')
+
+
+def get_memory_version() -> int:
+    """
+    Return the monotonic memory version, used by callers to invalidate cached memory search results.
+    """
+    return _memory_version
+
+
+def bump_memory_version() -> None:
+    """
+    Invalidate cached memory search results; called whenever the searchable memory changes.
+    """
+    global _memory_version
+    with _memory_version_lock:
+        _memory_version += 1
+
+
 def get_store_path(session_id: str, base_dir: str = "memory/session_logs") -> Path:
     """
     Construct the full path to the session file based on current date and session ID.
     Format: memory/session_logs/YYYY/MM/DD/<session_id>.json
     """
-    now = datetime.now()
-    day_dir = Path(base_dir) / str(now.year) / f"{now.month:02d}" / f"{now.day:02d}"
-    day_dir.mkdir(parents=True, exist_ok=True)
+    day_dir = Path(base_dir) / datetime.now().strftime("%Y/%m/%d")
+    if day_dir not in _ensured_dirs:
+        day_dir.mkdir(parents=True, exist_ok=True)
+        _ensured_dirs.add(day_dir)
     filename = f"{session_id}.json"
     return day_dir / filename
 
@@ -23,47 +73,193 @@ def simplify_session_id(session_id: str) -> str:
     """
     Return the simplified (short) version of the session ID for display/logging.
     """
-    return session_id.split("-")[0]
+    # Ids are plain hex now; for older dashed UUIDs this is still the first group
+    return session_id[:8]
 
 
 def append_session_to_store(session_obj, base_dir: str = "memory/session_logs") -> None:
     """
-    Save the session object as a standalone file. If a file already exists and is corrupt,
-    it will be overwritten with fresh data.
+    Save the session object as a standalone file, replacing any previous version of it.
+    """
+    session_data = session_obj.to_json()
+    session_data["_session_id_short"] = simplify_session_id(session_data["session_id"])
+    write_session_data(session_data, base_dir)
+
+
+def write_session_data(session_data: Dict, base_dir: str = "memory/session_logs") -> Path:
+    """
+    Write an already serialized session (output of AgentSession.to_json) to its store file.
+    Uses orjson when installed (datetimes are encoded natively); the file is replaced atomically.
+    Returns the file path.
     """
     def datetime_handler(obj):
         if isinstance(obj, datetime):
             return obj.isoformat()
         raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
-    session_data = session_obj.to_json()
-    session_data["_session_id_short"] = simplify_session_id(session_data["session_id"])
-
     store_path = get_store_path(session_data["session_id"], base_dir)
 
-    if store_path.exists():
+    # Write a sibling temp file and rename it over the store file: readers see either the old or the
+    # new contents, never a partial file. The thread id keeps concurrent writers of one session apart
+    tmp_path = store_path.with_name(f"{store_path.name}.{threading.get_ident()}.tmp")
+    if orjson is not None:
+        tmp_path.write_bytes(orjson.dumps(session_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(session_data, f, indent=2, default=datetime_handler)
+    os.replace(tmp_path, store_path)
+
+    logger.debug("✅ Session stored: %s", store_path)
+    return store_path
+
+
+def verify_session(store_path: Path) -> bool:
+    """
+    Diagnostics only: check that a stored session file parses as JSON.
+    Writes are atomic, so the write path itself never needs this check.
+    """
+    try:
+        with open(store_path, "rb") as f:
+            _loads(f.read())
+        return True
+    except (OSError, ValueError) as e:  # json and orjson decode errors both subclass ValueError
+        logger.warning(f"⚠️ Corrupt or unreadable session file {store_path}: {e}")
+        return False
+
+
+def iter_session_files(base_dir: str = "memory/session_logs"):
+    """
+    Yield the path of every stored session file under base_dir (the YYYY/MM/DD tree), using os.scandir
+    so directory entries are not stat'ed a second time.
+    """
+    pending = [base_dir]
+    while pending:
         try:
-            with open(store_path, "r", encoding="utf-8") as f:
-                existing = f.read().strip()
-                if existing:
-                    json.loads(existing)  # verify valid JSON
-        except json.JSONDecodeError:
-            print(f"⚠️ Warning: Corrupt JSON detected in {store_path}. Overwriting.")
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        pending.append(entry.path)
+                    elif entry.name.endswith(".json"):
+                        yield Path(entry.path)
+        except FileNotFoundError:
+            continue
+
+
+def _read_session_file(path: Path) -> Dict:
+    with open(path, "rb") as f:
+        return _loads(f.read())
+
+
+async def load_sessions(paths: Optional[List[Path]] = None, base_dir: str = "memory/session_logs",
+                        max_concurrency: int = SESSION_LOAD_CONCURRENCY) -> List[Dict]:
+    """
+    Bulk-load session files for post-run analysis (all of base_dir unless paths is given).
+    Reads run in worker threads, at most max_concurrency at a time, so disk I/O overlaps with parsing.
+    Unreadable or corrupt files are logged and skipped.
+    """
+    if paths is None:
+        paths = list(iter_session_files(base_dir))
+    sem = asyncio.Semaphore(max_concurrency)
 
-    with open(store_path, "w", encoding="utf-8") as f:
-        json.dump(session_data, f, indent=2, default=datetime_handler)
+    async def load(path: Path):
+        async with sem:
+            return await asyncio.to_thread(_read_session_file, path)
 
-    print(f"✅ Session stored: {store_path}")
+    results = await asyncio.gather(*(load(path) for path in paths), return_exceptions=True)
+    sessions = []
+    for path, result in zip(paths, results):
+        if isinstance(result, Exception):
+            logger.warning(f"⚠️ Skipping session file {path}: {result}")
+        else:
+            sessions.append(result)
+    return sessions
 
 
 def live_update_session(session_obj, base_dir: str = "memory/session_logs") -> None:
     """
     Update (or overwrite) the session file with latest data.
     In per-file format, this is identical to append.
+
+    Inside a running event loop the update is only queued: a background writer coalesces
+    updates per session and writes the latest state at most once every SESSION_WRITE_INTERVAL.
+    Call `await flush_session_updates()` when the file must be up to date on disk.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _write_session_update(session_obj.to_json(), session_obj.state.get("original_goal_achieved"), base_dir)
+        return
+
+    _pending_updates[session_obj.session_id] = (session_obj, base_dir)
+    _ensure_writer(loop)
+    _writer_wakeup.set()
+
+
+async def flush_session_updates(fsync: bool = False) -> None:
     """
+    Write every pending session update now and wait for it to reach disk.
+    With fsync=True, every file written by the background writer since the last fsync is also
+    flushed to stable storage (done once per run rather than on every write).
+    """
+    if _writer_loop is not asyncio.get_running_loop():
+        return
+    await _write_pending_updates()
+    if fsync and _unsynced_paths:
+        paths = list(_unsynced_paths)
+        _unsynced_paths.clear()
+        await asyncio.gather(*(asyncio.to_thread(_fsync_path, path) for path in paths))
+
+
+def _fsync_path(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        print(f"❌ Failed to fsync session file {path}: {e}")
+
+
+def _ensure_writer(loop) -> None:
+    global _writer_loop, _writer_task, _writer_wakeup, _write_lock
+    # Events and locks bind to the running loop, so (re)create them lazily on first use in each loop
+    if _writer_loop is not loop or _writer_task is None or _writer_task.done():
+        _writer_loop = loop
+        _writer_wakeup = asyncio.Event()
+        _write_lock = asyncio.Lock()
+        _writer_task = loop.create_task(_drain_session_updates())
+
+
+async def _drain_session_updates() -> None:
+    while True:
+        await _writer_wakeup.wait()
+        _writer_wakeup.clear()
+        await _write_pending_updates()
+        await asyncio.sleep(SESSION_WRITE_INTERVAL)
+
+
+async def _write_pending_updates() -> None:
+    async with _write_lock:
+        if not _pending_updates:
+            return
+        updates = list(_pending_updates.values())
+        _pending_updates.clear()
+
+        # Serialize on the loop thread, where sessions are mutated; only the file I/O is offloaded
+        snapshots = [(session_obj.to_json(), session_obj.state.get("original_goal_achieved"), base_dir)
+                     for session_obj, base_dir in updates]
+        await asyncio.gather(*(asyncio.to_thread(_write_session_update, *snapshot) for snapshot in snapshots))
+
+
+def _write_session_update(session_data: Dict, goal_achieved: bool, base_dir: str) -> None:
     try:
-        append_session_to_store(session_obj, base_dir)
-        print("📝 Session live-updated.")
+        session_data["_session_id_short"] = simplify_session_id(session_data["session_id"])
+        _unsynced_paths.add(write_session_data(session_data, base_dir))
+        logger.debug("📝 Session live-updated.")
+        # MemorySearch only indexes sessions whose goal was achieved
+        if goal_achieved:
+            bump_memory_version()
     except Exception as e:
         print(f"❌ Failed to update session: {e}")
 
@@ -94,8 +290,8 @@ def extract_session_state(session) -> Dict:
         if not session_file.exists():
             raise FileNotFoundError(f"Session log file not found: {session_file}")
             
-        with open(session_file, 'r') as f:
-            session_data = json.load(f)
+        with open(session_file, 'rb') as f:
+            session_data = _loads(f.read())
             
         # Get the state snapshot which contains the final state
         state_snapshot = session_data.get("state_snapshot", {})
@@ -115,33 +311,22 @@ def extract_session_state(session) -> Dict:
         final_steps = state_snapshot.get("final_steps", [])
         final_answer = state_snapshot.get("final_answer", "")
         
-        # Extract tool usage from steps
-        tool_usage = []
-        for step in final_steps:
-            if step.get("type") == "CODE":
-                code = step.get("code", {})
-                code_str = code.get("tool_arguments", {}).get("code", "")
-                
-                # Extract tool name from the code string
-                # Look for function calls like factorial(), sin(), etc.
-                tool_matches = re.findall(r'(\w+)\s*\(', code_str)
-                if tool_matches:
-                    tool_name = tool_matches[0]  # Get the first function call
-                    
-                    # Get execution result
-                    execution_result = step.get("execution_result", {})
-                    status = execution_result.get("status", "unknown")
-                    
-                    tool_usage.append({
-                        "tool_name": tool_name,
-                        "status": status,
-                        "step_index": step.get("index"),
-                        "description": step.get("description"),
-                        "result": execution_result.get("result", ""),
-                        "error": execution_result.get("error", None),
-                        "execution_time": execution_result.get("execution_time", ""),
-                        "total_time": execution_result.get("total_time", "")
-                    })
+        # Extract tool usage from steps; the tool is the first function call in the step's code
+        tool_usage = [
+            {
+                "tool_name": match.group(1),
+                "status": execution_result.get("status", "unknown"),
+                "step_index": step.get("index"),
+                "description": step.get("description"),
+                "result": execution_result.get("result", ""),
+                "error": execution_result.get("error", None),
+                "execution_time": execution_result.get("execution_time", ""),
+                "total_time": execution_result.get("total_time", "")
+            }
+            for step in final_steps if step.get("type") == "CODE"
+            for match in (_TOOL_CALL_RE.search(step.get("code", {}).get("tool_arguments", {}).get("code", "")),) if match
+            for execution_result in (step.get("execution_result", {}),)
+        ]
         
         return {
             "final_plan": final_plan,
@@ -177,18 +362,9 @@ def get_tool_success_rate(tool_usage: List[Dict]) -> Dict[str, Tuple[int, int]]:
     Returns:
         Dict mapping tool names to (success_count, total_attempts)
     """
-    tool_stats = {}
-    
-    for usage in tool_usage:
-        tool_name = usage["tool_name"]
-        if tool_name not in tool_stats:
-            tool_stats[tool_name] = [0, 0]  # [successes, total]
-            
-        tool_stats[tool_name][1] += 1  # increment total
-        if usage["status"] == "success":
-            tool_stats[tool_name][0] += 1  # increment successes
-            
-    return tool_stats
+    totals = Counter(usage["tool_name"] for usage in tool_usage)
+    successes = Counter(usage["tool_name"] for usage in tool_usage if usage["status"] == "success")
+    return {tool_name: (successes[tool_name], total) for tool_name, total in totals.items()}
 
 # Example usage in test_queries.py:
 """
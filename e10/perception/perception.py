@@ -1,12 +1,15 @@
 import os
+import re
 import json
+import asyncio
 import uuid
 import datetime
-from pathlib import Path
 from dotenv import load_dotenv
 from google import genai
 from google.genai.errors import ServerError
 from config.log_config import setup_logging
+from config.profiles import load_prompt
+from agent.llm_batcher import LLMBatcher
 
 logger = setup_logging(__name__)
 
@@ -14,6 +17,27 @@ load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
 client = genai.Client(api_key=api_key)
 
+# Defaults patched into model output so it always fits PerceptionSnapshot
+REQUIRED_FIELDS = {
+    "entities": [],
+    "result_requirement": "No requirement specified.",
+    "original_goal_achieved": False,
+    "reasoning": "No reasoning given.",
+    "local_goal_achieved": False,
+    "local_reasoning": "No local reasoning given.",
+    "last_tooluse_summary": "None",
+    "solution_summary": "No summary.",
+    "confidence": "0.0"
+}
+
+# Longest tool result still considered an obvious intermediate value (see Perception.try_fast_path)
+FAST_PATH_MAX_CHARS = 200
+# Tools often report errors and empty lookups as a successful string result; those need real perception
+FAST_PATH_REJECT_RE = re.compile(
+    r"error|exception|traceback|failed|failure|not found|no results?|none found|unavailable|invalid|timed? ?out|unknown",
+    re.IGNORECASE
+)
+
 class Perception:
     def __init__(self, perception_prompt_path: str, api_key: str | None = None, model: str = "gemini-2.0-flash"):
         load_dotenv()
@@ -24,6 +48,8 @@ class Perception:
 
         self.client = genai.Client(api_key=self.api_key)
         self.perception_prompt_path = perception_prompt_path
+        # Prompt files don't change while the agent runs; read and strip once per process
+        self.prompt_template = load_prompt(str(perception_prompt_path))
 
     def build_perception_input(self, raw_input: str, memory: list, current_plan = "", snapshot_type: str = "user_query") -> dict:
         if memory:
@@ -49,10 +75,100 @@ class Perception:
             "current_plan" : current_plan or "Inain Query Mode, plan not created"
         }
     
+    @staticmethod
+    def try_fast_path(executor_response: dict, current_plan: list, step_index: int) -> dict | None:
+        """
+        Build a perception result locally for a short, successful tool result in the middle of the plan.
+        Such a value is simply consumed by the next step, so the LLM round trip adds nothing.
+        Returns None when the result needs a real perception call.
+        """
+        if executor_response.get("status") != "success" or "source" in executor_response:
+            return None
+        if step_index + 1 >= len(current_plan or []):
+            return None  # last planned step: the result may be the final answer
+        result = str(executor_response.get("result", "")).strip()
+        if not result or len(result) > FAST_PATH_MAX_CHARS or result in {"None", "[]", "{}", "''"}:
+            return None
+        if FAST_PATH_REJECT_RE.search(result):
+            return None
+
+        return {
+            "entities": [],
+            "result_requirement": "Intermediate tool result for the next planned step.",
+            "original_goal_achieved": False,
+            "reasoning": "Tool call succeeded and further steps remain in the plan.",
+            "local_goal_achieved": True,
+            "local_reasoning": f"Step {step_index} returned a usable value.",
+            "last_tooluse_summary": f"Tool succeeded with result: {result}",
+            "solution_summary": "Not ready yet",
+            "confidence": "0.8"
+        }
+
+    @staticmethod
+    def is_cacheable(result: dict) -> bool:
+        """Only complete, non-zero-confidence results may be reused; overload and parse fallbacks must not be pinned."""
+        if not all(key in result for key in REQUIRED_FIELDS):
+            return False
+        try:
+            return float(result["confidence"]) > 0
+        except (TypeError, ValueError):
+            return False
+
+    async def run_async(self, perception_input: dict) -> dict:
+        """Run perception through the shared batcher so concurrent sessions are coalesced."""
+        # Instances with the same prompt and credentials are interchangeable, so pooled agents share one batcher
+        batcher = LLMBatcher.shared(("perception", self.perception_prompt_path, self.api_key), self._dispatch_batch)
+        return await batcher.submit(perception_input)
+
+    async def _dispatch_batch(self, perception_inputs: list[dict]) -> list[dict]:
+        return await asyncio.to_thread(self.run_batch, perception_inputs)
+
+    def run_batch(self, perception_inputs: list[dict]) -> list[dict]:
+        """Run perception on several inputs with a single LLM call, sharing one rendering of the prompt."""
+        if len(perception_inputs) == 1:
+            return [self.run(perception_inputs[0])]
+
+        full_prompt = (
+            f"{self.prompt_template}\n\n"
+            f"You are given {len(perception_inputs)} independent inputs. Analyse each one on its own and return a single JSON object "
+            f"of the form {{\"results\": [...]}} holding one ERORLL object per input. Each object must repeat its input's "
+            f"\"run_id\" field unchanged.\n\n"
+            f"```json\n{json.dumps(perception_inputs, indent=2)}\n```"
+        )
+
+        try:
+            response = self.client.models.generate_content(
+                model="gemini-2.0-flash",
+                contents=full_prompt
+            )
+            json_block = response.text.strip().split("```json")[1].split("```")[0].strip()
+            results = json.loads(json_block)["results"]
+        except Exception as e:
+            logger.warning(f"⚠️ Batched perception failed ({e}), falling back to one call per input")
+            return [self.run(p) for p in perception_inputs]
+
+        # Results are matched on the echoed run_id, never on position: a dropped or reordered
+        # object must not hand one session's analysis to another
+        by_run_id = {}
+        for output in results:
+            if isinstance(output, dict) and "run_id" in output:
+                by_run_id.setdefault(str(output.pop("run_id")), output)
+
+        outputs = []
+        for perception_input in perception_inputs:
+            output = by_run_id.get(perception_input["run_id"])
+            if output is None:
+                logger.warning(f"⚠️ Batched perception returned no result for run {perception_input['run_id']}, retrying it alone")
+                outputs.append(self.run(perception_input))
+                continue
+            for key, default in REQUIRED_FIELDS.items():
+                output.setdefault(key, default)
+            outputs.append(output)
+        return outputs
+
     def run(self, perception_input: dict) -> dict:
         """Run perception on given input using the specified prompt file."""
-        prompt_template = Path(self.perception_prompt_path).read_text(encoding="utf-8")
-        full_prompt = f"{prompt_template.strip()}\n\n```json\n{json.dumps(perception_input, indent=2)}\n```"
+        full_prompt = f"{self.prompt_template}\n\n```json\n{json.dumps(perception_input, indent=2)}\n```"
 
         #logger.info(f"🔍 Perception Prompt: {full_prompt}")
 
@@ -82,19 +198,7 @@ class Perception:
             output = json.loads(json_block)
 
             # ✅ Patch missing fields for PerceptionSnapshot
-            required_fields = {
-                "entities": [],
-                "result_requirement": "No requirement specified.",
-                "original_goal_achieved": False,
-                "reasoning": "No reasoning given.",
-                "local_goal_achieved": False,
-                "local_reasoning": "No local reasoning given.",
-                "last_tooluse_summary": "None",
-                "solution_summary": "No summary.",
-                "confidence": "0.0"
-            }
-
-            for key, default in required_fields.items():
+            for key, default in REQUIRED_FIELDS.items():
                 output.setdefault(key, default)
 
             return output
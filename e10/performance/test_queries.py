@@ -2,23 +2,29 @@
 
 import os
 import csv
+import argparse
+import contextlib
 import time
 import logging
 import asyncio
-import yaml
-import re
+import itertools
 from pathlib import Path
 from typing import List, Dict
-from collections import defaultdict
+from collections import Counter
+from aiolimiter import AsyncLimiter
 
 # Add the root directory to Python path
 import sys
-root_dir = Path(__file__).parent.parent
-sys.path.insert(0, str(root_dir))
+PERFORMANCE_DIR = Path(__file__).resolve().parent
+ROOT_DIR = PERFORMANCE_DIR.parent
+if str(ROOT_DIR) not in sys.path:  # inserting invalidates the import path cache
+    sys.path.insert(0, str(ROOT_DIR))
 
 from agent.agent_loop2 import AgentLoop
+from agent.llm_batcher import LLMBatcher
 from mcp_servers.multiMCP import MultiMCP
 from memory.session_log import extract_session_state
+from config.profiles import MCP_SERVER_YAML, load_yaml_config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,43 +32,47 @@ logger = logging.getLogger(__name__)
 
 # Configuration
 NUM_QUERIES = 100  # Number of queries to process
-SLEEP_TIME = 5    # Sleep time between queries in seconds
-INPUT_FILE = Path(__file__).parent / "test_queries_input.csv"
-OUTPUT_FILE = Path(__file__).parent / "test_queries_output.csv"
-
-class ToolStats:
-    def __init__(self):
-        self.total_calls = 0
-        self.success_calls = 0
-        self.error_calls = 0
-        
-    @property
-    def success_rate(self) -> float:
-        if self.total_calls == 0:
-            return 0.0
-        return (self.success_calls / self.total_calls) * 100
+CONCURRENCY = int(os.getenv("QUERY_CONCURRENCY", 4))  # Number of queries in flight at once
+QUERIES_PER_MINUTE = int(os.getenv("QUERY_RPM", 12))   # Query start rate cap, to stay under the LLM provider's quota
+INPUT_FILE = PERFORMANCE_DIR / "test_queries_input.csv"
+OUTPUT_FILE = PERFORMANCE_DIR / "test_queries_output.csv"
 
 class QueryTester:
-    def __init__(self):
-        """Initialize the query tester with agent and MCP"""
-        # Load server configs from yaml
-        with open(root_dir / "config" / "mcp_server_config.yaml", "r") as f:
-            server_configs = yaml.safe_load(f)
-            
+    def __init__(self, concurrency: int = CONCURRENCY, collect_stats: bool = True):
+        """Initialize the query tester with agent and MCP; collect_stats enables the tool performance report"""
+        # Load server configs from yaml; MultiMCP takes the list of servers, as in main.py
+        server_configs = list(load_yaml_config(MCP_SERVER_YAML).get("mcp_servers", []))
+
         # Initialize MCP + Dispatcher
         self.multi_mcp = MultiMCP(server_configs=server_configs)
         
-        # Initialize agent loop
-        self.agent_loop = AgentLoop(
-            perception_prompt_path="prompts/perception_prompt.txt",
-            decision_prompt_path="prompts/decision_prompt.txt",
-            multi_mcp=self.multi_mcp,
-            strategy="exploratory"
-        )
+        # Initialize agent loops; AgentLoop keeps per-run state (step counters, speculative plan),
+        # so every query in flight borrows its own from this pool
+        self.agent_loops = asyncio.Queue()
+        for _ in range(concurrency):
+            self.agent_loops.put_nowait(AgentLoop(
+                perception_prompt_path="prompts/perception_prompt.txt",
+                decision_prompt_path="prompts/decision_prompt.txt",
+                multi_mcp=self.multi_mcp,
+                strategy="exploratory"
+            ))
         
         # Initialize tool statistics
-        self.tool_stats = defaultdict(ToolStats)
-        
+        self.collect_stats = collect_stats
+        # Token bucket instead of a fixed sleep between queries: a run only waits when queries
+        # start faster than the provider's cap, never after a query that was slow anyway
+        self._limiter = AsyncLimiter(QUERIES_PER_MINUTE, 60)
+        self._total = Counter()    # tool name -> calls
+        self._success = Counter()  # tool name -> successful calls
+        
+    async def aopen(self) -> None:
+        """Scan the MCP servers' tools once, before any query runs; every AgentLoop shares the dispatcher."""
+        await self.multi_mcp.initialize()
+
+    async def aclose(self) -> None:
+        LLMBatcher.close_all()
+        await self.multi_mcp.shutdown()
+
     def log_tool_stats(self, tool_usage: List[Dict]) -> None:
         """
         Log tool usage statistics for a single query.
@@ -70,22 +80,19 @@ class QueryTester:
         Args:
             tool_usage: List of tool usage dictionaries from extract_session_state
         """
-        for tool in tool_usage:
-            tool_name = tool["tool_name"]
-            status = tool["status"]
-            
-            # Update statistics
-            self.tool_stats[tool_name].total_calls += 1
-            if status == "success":
-                self.tool_stats[tool_name].success_calls += 1
-            else:
-                self.tool_stats[tool_name].error_calls += 1
+        if not self.collect_stats:
+            return
+        self._total.update(tool["tool_name"] for tool in tool_usage)
+        self._success.update(tool["tool_name"] for tool in tool_usage if tool["status"] == "success")
     
     def write_tool_performance_report(self) -> None:
         """
         Write tool performance statistics to a CSV file in the performance folder.
         The file is overwritten each time the script runs.
         """
+        if not self.collect_stats:
+            return
+
         # Create performance directory if it doesn't exist
         performance_dir = Path("performance")
         performance_dir.mkdir(exist_ok=True)
@@ -93,20 +100,17 @@ class QueryTester:
         # Set the output file path in the performance directory
         output_file = performance_dir / "tool_performance_status.csv"
         
+        # Rates are computed once here, in one pass
+        rows = [
+            (tool_name, total, f"{self._success[tool_name] / total * 100:.2f}")
+            for tool_name, total in sorted(self._total.items())
+        ]
+
         # Write the file in 'w' mode to overwrite any existing content
-        with open(output_file, 'w', newline='') as f:
+        with open(output_file, 'w', newline='', buffering=1 << 16) as f:
             writer = csv.writer(f)
-            
-            # Write header
             writer.writerow(["Tool Name", "Number of Times Invoked", "Success Rate (%)"])
-            
-            # Write data for each tool
-            for tool_name, stats in sorted(self.tool_stats.items()):
-                writer.writerow([
-                    tool_name,
-                    stats.total_calls,
-                    f"{stats.success_rate:.2f}"
-                ])
+            writer.writerows(rows)
         
         print(f"✅ Tool performance report written to {output_file}")
         
@@ -122,15 +126,19 @@ class QueryTester:
         Returns:
             Dict containing query results including plan, output, and tool usage
         """
+        agent_loop = await self.agent_loops.get()
         try:
             # Run the query through the agent
-            session = await self.agent_loop.run(query)
+            async with self._limiter:
+                session = await agent_loop.run(query)
             
             # Extract session state using the new function
             session_state = extract_session_state(session)
 
-            logger.debug(f"Session: {session}")
-            logger.debug(f"Session State: {session_state}")
+            debug = logger.isEnabledFor(logging.DEBUG)  # skip repr() of whole sessions unless it is logged
+            if debug:
+                logger.debug("Session: %s", session)
+                logger.debug("Session State: %s", session_state)
             
             # Format the final plan - handle both list and string cases
             final_plan = session_state["final_plan"]
@@ -142,36 +150,21 @@ class QueryTester:
             
             # Log the tool usage for analysis
             tool_usage = session_state["tool_usage"]
-            if tool_usage:
-                logger.debug(f"Tool usage for query '{query}':")
-                for tool in tool_usage:
-                    logger.debug(f"- {tool['tool_name']}: {tool['status']} (Step {tool['step_index']})")
-            
-            logger.debug(f"Final Plan: {final_plan}")
-            logger.debug(f"Final Answer: {final_answer}")    
-            logger.debug(f"Tool Usage: {tool_usage}")
+            if debug:
+                logger.debug("Final Plan: %s", final_plan)
+                logger.debug("Final Answer: %s", final_answer)
+                logger.debug("Tool Usage: %s", tool_usage)
 
             # Log tool statistics for this query
-            self.log_tool_stats(session_state["tool_usage"])
-
-            # Extract tools executed for this query
-            tools_executed = []
-            for step in session_state["final_steps"]:
-                if step.get("type") == "CODE":
-                    code = step.get("code", {})
-                    code_str = code.get("tool_arguments", {}).get("code", "")
-                
-                    # Extract tool name from the code string using regex
-                    tool_matches = re.findall(r'(\w+)\s*\(', code_str)
-                    if tool_matches:
-                        tool_name = tool_matches[0]  # Get the first function call
-                        status = step.get("execution_result", {}).get("status", "unknown")
-                        tools_executed.append(f"{tool_name}({status})")
-        
+            self.log_tool_stats(tool_usage)
+
+            # Tools executed for this query; extract_session_state already parsed them into tool_usage
+            tools_executed = [f"{tool['tool_name']}({tool['status']})" for tool in tool_usage]
+
             # Join all tools with commas
             tools_executed_str = ", ".join(tools_executed) if tools_executed else "No tools executed"
 
-            logger.debug(f"Tools Executed: {tools_executed_str}")
+            logger.debug("Tools Executed: %s", tools_executed_str)
 
             return {
                 "query": query,
@@ -194,37 +187,37 @@ class QueryTester:
                 "tool_usage": [],  # Empty tool usage for failed queries
                 "tools_executed": "Error Occured"  # Include tools executed in the result
             }
+        finally:
+            self.agent_loops.put_nowait(agent_loop)
 
-async def main():
-    """Main function to process queries one at a time"""
+async def main(with_stats: bool = True):
+    """Main function to process queries, up to CONCURRENCY at a time"""
     try:
         # Initialize query tester
-        tester = QueryTester()
-        
-        # Create output file with headers (overwriting any existing file)
-        with open(OUTPUT_FILE, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['Query', 'Tools Needed', 'Complexity', 'Final Plan', 'Output', 'Tools Executed'])
-            writer.writeheader()
-        
-        # Process queries one at a time
-        with open(INPUT_FILE, 'r') as f:
-            reader = csv.DictReader(f)
-            for i, row in enumerate(reader):
-                if i >= NUM_QUERIES:
-                    break
-                    
-                query = row['Query']
-                tools = row['Tools Needed']
-                complexity = row['Complexity']
-                
-                print(f"🔍 Processing query {i+1}/{NUM_QUERIES}: {query}\n")
-                
-                # Execute query
-                result = await tester.execute_query(query, tools, complexity)
-                
-                # Write result immediately
-                with open(OUTPUT_FILE, 'a', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=['Query', 'Tools Needed', 'Complexity', 'Final Plan', 'Output', 'Tools Executed'])
+        tester = QueryTester(collect_stats=with_stats)
+        await tester.aopen()
+        try:
+            sem = asyncio.Semaphore(CONCURRENCY)
+            async def run_one(i: int, row: Dict) -> Dict:
+                async with sem:
+                    print(f"🔍 Processing query {i+1}/{NUM_QUERIES}: {row['Query']}\n")
+                    return await tester.execute_query(row['Query'], row['Tools Needed'], row['Complexity'])
+
+            # Input and output share one lifetime; the output is opened once with a single writer for the whole run
+            with contextlib.ExitStack() as stack:
+                input_f = stack.enter_context(open(INPUT_FILE, 'r', newline='', encoding='utf-8', buffering=1 << 20))
+                output_f = stack.enter_context(open(OUTPUT_FILE, 'w', newline='', encoding='utf-8', buffering=1 << 20))
+
+                # The input is small: slurp it up front so no input reads interleave with agent work
+                rows = list(itertools.islice(csv.DictReader(input_f), NUM_QUERIES))
+                tasks = [asyncio.create_task(run_one(i, row)) for i, row in enumerate(rows)]
+
+                # Write each result as it completes, so partial progress survives a crash;
+                # rows therefore follow completion order
+                writer = csv.DictWriter(output_f, fieldnames=['Query', 'Tools Needed', 'Complexity', 'Final Plan', 'Output', 'Tools Executed'])
+                writer.writeheader()
+                for future in asyncio.as_completed(tasks):
+                    result = await future
                     writer.writerow({
                         'Query': result['query'],
                         'Tools Needed': result['tools'],
@@ -233,20 +226,22 @@ async def main():
                         'Output': result['output'],
                         'Tools Executed': result['tools_executed']
                     })
-                
-                # Sleep between queries
-                if i < NUM_QUERIES - 1:
-                    print(f"\n⌛ Sleeping for {SLEEP_TIME} seconds...\n")
-                    await asyncio.sleep(SLEEP_TIME)
+                    output_f.flush()
         
-        # Write tool performance report
-        tester.write_tool_performance_report()
+            # Write tool performance report (no-op unless stats are collected)
+            tester.write_tool_performance_report()
         
-        print(f"All queries processed. Results written to {OUTPUT_FILE}")
+            print(f"All queries processed. Results written to {OUTPUT_FILE}")
+        finally:
+            await tester.aclose()
         
     except Exception as e:
         logger.error(f"Error in main: {str(e)}")
         raise
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the benchmark queries through the agent")
+    parser.add_argument("--no-stats", dest="with_stats", action="store_false",
+                        help="skip the tool performance report (written by default)")
+    args = parser.parse_args()
+    asyncio.run(main(with_stats=args.with_stats))
\ No newline at end of file
@@ -1,13 +1,33 @@
 import os
 import json
-import yaml
 import csv
+import io
 import logging
+import time
+from string import Template
 from pathlib import Path
 from typing import List, Dict
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from google import genai
+from google.genai.errors import ClientError
 from dotenv import load_dotenv
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # stdlib json fallback
+    _json_loads = json.loads
+
+# Add the root directory to Python path
+import sys
+PERFORMANCE_DIR = Path(__file__).resolve().parent
+ROOT_DIR = PERFORMANCE_DIR.parent
+if str(ROOT_DIR) not in sys.path:  # inserting invalidates the import path cache
+    sys.path.insert(0, str(ROOT_DIR))
+
+from config.profiles import load_profiles
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,17 +36,23 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 NUM_QUERIES = 100  # Configurable number of queries to generate
+GENERATION_BATCHES = 4  # Parallel LLM calls the queries are split across
+MAX_RETRIES = 3  # Generation rounds; failed batches and duplicates are topped up in the next round
+RETRY_BACKOFF = 2  # Seconds before the second round, doubled after each round
 
 class QueryGenerator:
     def __init__(self):
         """Initialize the query generator with configuration"""
-        self.root = Path(__file__).parent.parent
+        self.root = ROOT_DIR
         self.config_path = self.root / "config" / "models.json"
         self.profile_path = self.root / "config" / "profiles.yaml"
         
-        # Load configuration
-        self.config = json.loads(self.config_path.read_text())
-        self.profile = yaml.safe_load(self.profile_path.read_text())
+        # Load configuration; the two files are independent, so read and parse them in parallel
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            config_future = pool.submit(self._load_json, self.config_path)
+            profile_future = pool.submit(load_profiles, self.profile_path)
+            self.config = config_future.result()
+            self.profile = profile_future.result()
         
         # Initialize Gemini client
         api_key = os.getenv("GOOGLE_API_KEY")
@@ -38,9 +64,10 @@ class QueryGenerator:
         self.text_model_key = self.profile["llm"]["text_generation"]
         self.model_info = self.config["models"][self.text_model_key]
         
-        # Load prompt template
-        self.prompt_path = self.root / "performance" / "query_generator_prompt.txt"
-        self.prompt_template = self.prompt_path.read_text()
+        # Prompt template, loaded on first use by generate_queries
+        self.prompt_path = PERFORMANCE_DIR / "query_generator_prompt.txt"
+        self._prompt_template = None
+        self._formatted_prompts: Dict[int, str] = {}  # query count -> prompt
         
         # Query distribution
         self.complexity_distribution = {
@@ -53,6 +80,18 @@ class QueryGenerator:
         # Number of queries to generate
         self.num_queries = NUM_QUERIES  # Use the config value
         
+    @staticmethod
+    def _load_json(path: Path) -> Dict:
+        # Binary mode: both parsers take the raw bytes, no separate text decode pass
+        with open(path, 'rb') as f:
+            return _json_loads(f.read())
+
+    @property
+    def prompt_template(self) -> str:
+        if self._prompt_template is None:
+            self._prompt_template = self.prompt_path.read_text()
+        return self._prompt_template
+
     def _generate_with_llm(self, prompt: str) -> str:
         """Generate text using the LLM"""
         try:
@@ -78,14 +117,9 @@ class QueryGenerator:
         """Parse the LLM response into a list of query dictionaries"""
         queries = []
         try:
-            # Split response into lines and process each line
-            lines = response.strip().split('\n')
-            for line in lines:
-                if not line.strip():
-                    continue
-                    
-                # Parse CSV format
-                parts = [part.strip() for part in line.split(',')]
+            # Parse CSV format; csv.reader handles quoted queries that contain commas
+            for row in csv.reader(io.StringIO(response.strip())):
+                parts = [part.strip() for part in row]
                 if len(parts) >= 3:
                     # Convert complexity to lowercase to match our distribution keys
                     complexity = parts[2].lower()
@@ -110,44 +144,97 @@ class QueryGenerator:
             logger.error(f"Error parsing LLM response: {str(e)}")
             raise
     
+    def _prompt_for(self, count: int) -> str:
+        """The prompt asking for `count` queries, formatted once per count"""
+        if count not in self._formatted_prompts:
+            self._formatted_prompts[count] = Template(self.prompt_template).safe_substitute(num_queries=count)
+        return self._formatted_prompts[count]
+
+    @staticmethod
+    def _dedupe_queries(queries: List[Dict]) -> List[Dict]:
+        """Drop queries whose text matches an earlier one, ignoring case and whitespace"""
+        seen = set()
+        unique = []
+        for query in queries:
+            key = " ".join(query["query"].lower().split())
+            if key not in seen:
+                seen.add(key)
+                unique.append(query)
+        if len(unique) < len(queries):
+            logger.info("Dropped %d duplicate queries", len(queries) - len(unique))
+        return unique
+
+    @staticmethod
+    def _batch_counts(total: int) -> List[int]:
+        # Split the queries across parallel calls; generation time grows with output length,
+        # so K calls of N/K queries finish in roughly 1/K of the time
+        batches = max(1, min(GENERATION_BATCHES, total))
+        return [total // batches + (i < total % batches) for i in range(batches)]
+
+    def _generate_batch(self, count: int) -> List[Dict] | Exception:
+        """One batch of `count` parsed queries; a failure is returned rather than raised, so it costs only this batch"""
+        try:
+            return self._parse_llm_response(self._generate_with_llm(self._prompt_for(count)))
+        except ClientError as e:
+            if e.code != 429:
+                raise  # bad request or credentials: another round won't help
+            return e
+        except Exception as e:
+            return e
+
     def generate_queries(self) -> List[Dict]:
         """Generate queries using the LLM"""
-        # Prepare the prompt with the number of queries
-        prompt = self.prompt_template.replace("10", str(self.num_queries))
-        
-        # Generate queries using LLM
-        logger.info("Generating queries with LLM...")
-        response = self._generate_with_llm(prompt)
-        
-        # Parse the response
-        queries = self._parse_llm_response(response)
+        queries: List[Dict] = []
+        missing = self.num_queries
+        for attempt in range(MAX_RETRIES):
+            if attempt:
+                delay = RETRY_BACKOFF * 2 ** (attempt - 1)
+                logger.warning("%d queries still missing, topping up in %ss", missing, delay)
+                time.sleep(delay)  # between rounds, so a backoff never holds a pool thread
+
+            # Generate queries using LLM; genai.Client is synchronous, so fan out on threads
+            counts = self._batch_counts(missing)
+            logger.info("Generating %d queries with LLM in %d batch(es)...", missing, len(counts))
+            with ThreadPoolExecutor(max_workers=len(counts)) as pool:
+                outcomes = list(pool.map(self._generate_batch, counts))
+            for count, outcome in zip(counts, outcomes):
+                if isinstance(outcome, Exception):
+                    logger.warning("Batch of %d queries failed: %s", count, outcome)
+                else:
+                    queries.extend(outcome)
+
+            # Independent batches share one prompt, so they can repeat each other
+            queries = self._dedupe_queries(queries)
+            missing = self.num_queries - len(queries)
+            if missing <= 0:
+                break
+        else:
+            logger.warning("Generated %d of %d queries; %d missing after %d rounds",
+                           len(queries), self.num_queries, missing, MAX_RETRIES)
+        if not queries:
+            raise ValueError("No valid queries were generated")
         
         # Validate the distribution
-        complexity_counts = {level: 0 for level in self.complexity_distribution}
-        for query in queries:
-            complexity_counts[query["complexity"]] += 1
-            
+        complexity_counts = Counter(query["complexity"] for query in queries)
+
         # Log the distribution
         logger.info("Query complexity distribution:")
-        for level, count in complexity_counts.items():
-            percentage = (count / self.num_queries) * 100
-            logger.info(f"{level}: {count} queries ({percentage:.1f}%)")
+        for level in self.complexity_distribution:
+            count = complexity_counts[level]
+            logger.info("%s: %d queries (%.1f%%)", level, count, count / self.num_queries * 100)
             
         return queries
     
     def write_queries_to_csv(self, queries: List[Dict], output_file: str):
         """Write the generated queries to a CSV file"""
         try:
-            with open(output_file, 'w', newline='') as f:
+            with open(output_file, 'w', newline='', buffering=1 << 16) as f:
                 writer = csv.writer(f)
                 writer.writerow(['Query', 'Tools Needed', 'Complexity'])
-                
-                for query in queries:
-                    writer.writerow([
-                        query['query'],
-                        '|'.join(query['tools']),
-                        query['complexity']
-                    ])
+                writer.writerows(
+                    (query['query'], '|'.join(query['tools']), query['complexity'])
+                    for query in queries
+                )
                     
             logger.info(f"Queries written to {output_file}")
             
@@ -165,7 +252,7 @@ def main():
         queries = generator.generate_queries()
         
         # Write queries to CSV
-        output_file = Path(__file__).parent / "test_queries_input.csv"
+        output_file = PERFORMANCE_DIR / "test_queries_input.csv"
         generator.write_queries_to_csv(queries, output_file)
         
         logger.info("Query generation completed successfully")
@@ -0,0 +1,4 @@
+import os
+
+# perception/decision build a genai client at import time; tests never reach the API
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from agent.agentSession import AgentSession, Step
+from agent.human_intervention import HumanIntervention
+
+
+def make_intervention(step_index=0, was_successful=True):
+    return HumanIntervention(
+        timestamp=datetime(2025, 1, 1),
+        step_index=step_index,
+        tool_name="add",
+        tool_arguments={"a": 1},
+        error_message="boom",
+        human_input="2",
+        attempt_number=1,
+        lifelines_remaining=2,
+        was_successful=was_successful
+    )
+
+
+def test_mutating_a_serialized_step_does_not_leak_into_later_snapshots():
+    step = Step(index=0, description="add numbers", type="CODE")
+    first = step.to_dict()
+    first["status"] = "corrupted"
+    first["human_interventions"].append("corrupted")
+
+    second = step.to_dict()
+    assert second["status"] == "pending"
+    assert second["human_interventions"] == []
+
+
+def test_to_dict_reflects_in_place_changes_to_nested_objects():
+    step = Step(index=0, description="add numbers", type="CODE")
+    step.to_dict()
+
+    intervention = make_intervention(was_successful=False)
+    step.human_interventions.append(intervention)
+    assert step.to_dict()["human_interventions"][0]["was_successful"] is False
+
+    intervention.was_successful = True
+    assert step.to_dict()["human_interventions"][0]["was_successful"] is True
+
+
+def test_confidence_is_only_serialized_when_set():
+    assert "confidence" not in Step(index=0, description="a", type="CODE").to_dict()
+    assert Step(index=1, description="b", type="CONCLUDE", confidence=0.95).to_dict()["confidence"] == 0.95
+
+
+def test_human_intervention_updates_completed_steps():
+    session = AgentSession(original_query="q")
+    step = Step(index=0, description="add numbers", type="CODE")
+    session.add_plan_version(["Step 0: add numbers"], [step])
+    assert session.completed_steps() == []
+
+    session.add_human_intervention(step, make_intervention(was_successful=True))
+    assert [s["index"] for s in session.completed_steps()] == [0]
+
+    session.add_human_intervention(step, make_intervention(was_successful=False))
+    assert session.completed_steps() == []
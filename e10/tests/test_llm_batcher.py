@@ -0,0 +1,128 @@
+import asyncio
+import gc
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from agent.llm_batcher import LLMBatcher
+from decision.decision import Decision
+from perception.perception import Perception
+
+PROMPT_PATH = "prompts/perception_prompt.txt"
+DECISION_PROMPT_PATH = "prompts/decision_prompt.txt"
+
+
+def fake_client(text):
+    """A genai client stand-in whose generate_content answers with `text` (both response shapes)."""
+    response = SimpleNamespace(text=text, candidates=[SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(text=text)]))])
+    return SimpleNamespace(models=SimpleNamespace(generate_content=lambda model, contents: response))
+
+
+def json_block(payload):
+    return f"```json\n{json.dumps(payload)}\n```"
+
+
+@pytest.fixture(autouse=True)
+def _clean_registry():
+    yield
+    LLMBatcher.close_all()
+
+
+def test_concurrent_run_async_calls_share_one_run_batch(monkeypatch):
+    calls = []
+
+    def run_batch(self, perception_inputs):
+        calls.append(len(perception_inputs))
+        return [{"echo": p["raw_input"]} for p in perception_inputs]
+
+    monkeypatch.setattr(Perception, "run_batch", run_batch)
+    # Like the QueryTester pool: each agent owns its own Perception
+    agents = [Perception(PROMPT_PATH) for _ in range(4)]
+
+    async def main():
+        inputs = [agent.build_perception_input(f"query {i}", []) for i, agent in enumerate(agents)]
+        return await asyncio.gather(*(agent.run_async(p) for agent, p in zip(agents, inputs)))
+
+    results = asyncio.run(main())
+    assert calls == [4]
+    assert [r["echo"] for r in results] == [f"query {i}" for i in range(4)]
+
+
+def test_registry_does_not_keep_dispatchers_alive():
+    class Owner:
+        async def dispatch(self, payloads):
+            return payloads
+
+    owner = Owner()
+    LLMBatcher.shared("owner", owner.dispatch)
+    del owner
+    gc.collect()
+    assert LLMBatcher._instances["owner"]._dispatch_ref() is None
+
+
+def test_dispatch_failure_reaches_every_caller():
+    async def dispatch(payloads):
+        raise RuntimeError("boom")
+
+    async def main():
+        batcher = LLMBatcher.shared("failing", dispatch)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_close_cancels_pending_callers_and_evicts():
+    async def dispatch(payloads):
+        await asyncio.sleep(10)
+        return payloads
+
+    async def main():
+        batcher = LLMBatcher.shared("slow", dispatch)
+        pending = asyncio.create_task(batcher.submit(1))
+        await asyncio.sleep(0.05)
+        batcher.close()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+        return batcher
+
+    batcher = asyncio.run(main())
+    assert "slow" not in LLMBatcher._instances
+    assert not batcher._inflight
+
+
+def test_perception_batch_retries_only_unmatched_inputs(monkeypatch):
+    perception = Perception(PROMPT_PATH)
+    inputs = [perception.build_perception_input(f"query {i}", []) for i in range(3)]
+    # The model drops the second input and answers the others out of order
+    perception.client = fake_client(json_block({"results": [
+        {"run_id": inputs[2]["run_id"], "solution_summary": "two"},
+        {"run_id": inputs[0]["run_id"], "solution_summary": "zero"},
+    ]}))
+    retried = []
+    monkeypatch.setattr(Perception, "run", lambda self, p: retried.append(p["raw_input"]) or {"solution_summary": "alone"})
+
+    outputs = perception.run_batch(inputs)
+    assert [o["solution_summary"] for o in outputs] == ["zero", "alone", "two"]
+    assert retried == ["query 1"]
+    assert outputs[0]["confidence"] == "0.0"  # missing fields get their defaults
+
+
+def test_decision_batch_retries_only_unmatched_inputs(monkeypatch):
+    decision = Decision(DECISION_PROMPT_PATH, SimpleNamespace(tool_description_wrapper=lambda: []))
+    inputs = [{"plan_mode": "initial", "original_query": f"query {i}"} for i in range(3)]
+    decision.client = fake_client(json_block({"results": [
+        {"batch_index": 0, "type": "CODE", "description": "zero"},
+        {"batch_index": 1, "next_step": {"type": "CODE", "description": "one"}},
+    ]}))
+    retried = []
+    monkeypatch.setattr(Decision, "_run_llm", lambda self, d: retried.append(d["original_query"]) or {"type": "CODE", "description": "alone"})
+
+    outputs = decision.run_batch(inputs)
+    assert [o["description"] for o in outputs] == ["zero", "one", "alone"]
+    assert retried == ["query 2"]
+
+    # Batched answers are cached like single ones, so a repeat needs no LLM call at all
+    decision.client = None
+    assert [o["description"] for o in decision.run_batch(inputs)] == ["zero", "one", "alone"]
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+import memory.memory_search as memory_search
+from memory.memory_search import VECTOR_MIN_ENTRIES, MemorySearch
+from memory.session_log import get_memory_version
+
+
+def unit_vectors(texts):
+    rng = np.random.default_rng(len(texts))
+    vectors = rng.random((len(texts), 8), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def searcher(tmp_path):
+    searcher = MemorySearch(logs_path=str(tmp_path))
+    for i in range(VECTOR_MIN_ENTRIES + 10):
+        searcher.add({"query": f"query {i}", "result_requirement": "r", "solution_summary": f"summary {i}"})
+    return searcher
+
+
+def test_embedding_requests_run_outside_the_lock(searcher, monkeypatch):
+    def get_embeddings(texts):
+        assert not searcher._lock.locked()
+        return unit_vectors(texts)
+
+    monkeypatch.setattr(memory_search, "get_embeddings", get_embeddings)
+    monkeypatch.setattr(memory_search, "embed_with_cache", lambda text: get_embeddings([text])[0])
+
+    assert len(searcher.search_memory("query 7")) == 3
+    assert searcher._emb_count == len(searcher._entries)
+    assert not searcher._vector_dirty
+
+
+def test_failed_embedding_keeps_index_dirty_and_backs_off(searcher, monkeypatch):
+    calls = []
+
+    def get_embeddings(texts):
+        calls.append(len(texts))
+        return None if len(calls) == 1 else unit_vectors(texts)
+
+    monkeypatch.setattr(memory_search, "get_embeddings", get_embeddings)
+    monkeypatch.setattr(memory_search, "embed_with_cache", lambda text: unit_vectors([text])[0])
+
+    searcher.search_memory("query 7")  # embedding fails: fuzzy scan, retry scheduled
+    assert searcher._vector_dirty and searcher._emb_matrix is None
+
+    searcher.search_memory("query 7")  # still inside the backoff window: no new request
+    assert len(calls) == 1
+
+    searcher._vector_retry_at = 0.0
+    searcher.search_memory("query 7")
+    assert len(calls) == 2
+    assert not searcher._vector_dirty and searcher._emb_count == len(searcher._entries)
+
+
+def test_rrf_fuses_both_rankings():
+    searcher = MemorySearch(logs_path="unused", use_vectors=False)
+    searcher._entries = [{"query": f"q{i}"} for i in range(4)]
+    searcher._semantic_ranking = lambda query, depth, embedding: [0, 1, 2, 3]
+    searcher._lexical_ranking = lambda query, depth: [3, 2]
+    searcher._refresh = lambda: None
+
+    # 3 and 2 appear in both lanes and outrank 0, which only tops one of them
+    assert [e["query"] for e in searcher.search_memory("anything")] == ["q3", "q2", "q0"]
+
+    searcher._lexical_ranking = lambda query, depth: []
+    assert [e["query"] for e in searcher.search_memory("anything")] == ["q0", "q1", "q2"]
+
+
+def test_lexical_lane_surfaces_exact_identifiers(tmp_path):
+    searcher = MemorySearch(logs_path=str(tmp_path), use_vectors=False)
+    for i in range(20):
+        searcher.add({"query": f"what is the weather in city {i}", "result_requirement": "r",
+                      "solution_summary": f"the weather in city {i} is sunny"})
+    searcher.add({"query": "look up an order", "result_requirement": "r", "solution_summary": "order ZX9Q42 shipped"})
+
+    assert searcher.search_memory("status of ZX9Q42")[0]["solution_summary"] == "order ZX9Q42 shipped"
+
+
+def test_add_bumps_memory_version_once_per_new_record(tmp_path):
+    searcher = MemorySearch(logs_path=str(tmp_path), use_vectors=False)
+    record = {"query": "capital of france", "result_requirement": "r", "solution_summary": "paris"}
+
+    version = get_memory_version()
+    searcher.add(record)
+    assert get_memory_version() == version + 1
+    searcher.add(dict(record))  # duplicate: nothing changed, cached results stay valid
+    assert get_memory_version() == version + 1
+    assert searcher.search_memory("capital of france")[0]["solution_summary"] == "paris"
@@ -0,0 +1,21 @@
+import pickle
+
+from config.profiles import _parse_yaml_config, load_yaml_config
+
+
+def test_malformed_sidecar_falls_back_to_yaml(tmp_path):
+    config_path = tmp_path / "profiles.yaml"
+    config_path.write_text("strategy:\n  max_steps: 3\n")
+    # Unpickles fine but is not a (mtime, config) pair
+    config_path.with_suffix(".pkl").write_bytes(pickle.dumps({"unexpected": "shape"}))
+
+    assert load_yaml_config(config_path) == {"strategy": {"max_steps": 3}}
+
+
+def test_callers_cannot_mutate_the_shared_config(tmp_path):
+    config_path = tmp_path / "profiles.yaml"
+    config_path.write_text("strategy:\n  max_steps: 3\n")
+
+    load_yaml_config(config_path)["strategy"]["max_steps"] = 99
+    assert load_yaml_config(config_path)["strategy"]["max_steps"] == 3
+    _parse_yaml_config.cache_clear()
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from memory.semantic_cache import QVCache
+
+
+def similar_pair(similarity, axis=1, dim=16):
+    """Two unit vectors with the given cosine similarity; `axis` picks the direction of the second."""
+    a = np.zeros(dim, dtype=np.float32)
+    b = np.zeros(dim, dtype=np.float32)
+    a[0] = 1.0
+    b[0], b[axis] = similarity, np.sqrt(1 - similarity ** 2)
+    return a, b
+
+
+def test_lookup_hits_above_threshold_and_misses_below():
+    cache = QVCache(threshold=0.92)
+    a, b = similar_pair(0.95)
+    cache.add(a, "answer")
+
+    score, value = cache.lookup(a * 3)  # keys are normalized, so scale doesn't matter
+    assert value == "answer" and score > 0.99
+    assert cache.lookup(b) is not None
+
+    _, far = similar_pair(0.5)
+    assert cache.lookup(far) is None
+    assert cache.lookup(None) is None
+
+
+def test_differing_neighbour_raises_region_threshold():
+    cache = QVCache(threshold=0.92, margin=0.01)
+    a, b = similar_pair(0.95)
+    cache.add(a, "paris")
+    cache.add(b, "london")
+
+    assert len(cache.cluster_thresholds) == 1
+    assert cache.cluster_thresholds[0] >= 0.96 - 1e-5
+    # `a` itself still hits, but a query the base threshold would have matched to it no longer does
+    assert cache.lookup(a)[1] == "paris"
+    _, near_a = similar_pair(0.955, axis=2)
+    assert cache.lookup(near_a) is None
+
+
+def test_equivalent_neighbour_relaxes_region_threshold_down_to_min():
+    cache = QVCache(threshold=0.99, min_threshold=0.96)
+    a, b = similar_pair(0.95)
+    cache.add(a, "answer", fingerprint="42")
+    cache.add(b, "answer, rephrased", fingerprint="42")
+
+    # 0.95 is below the base threshold, so `b` opens its own region, which learns the lower bar
+    region = len(cache.cluster_thresholds) - 1
+    assert cache.cluster_thresholds[region] == pytest.approx((0.99 + 0.95) / 2)
+    assert cache.lookup(a)[1] == "answer"
+
+    # Halfway to 0.90 would be 0.945; the region stops at min_threshold
+    _, c = similar_pair(0.9, axis=2)
+    cache.add(c, "answer", fingerprint="42")
+    assert cache.cluster_thresholds[-1] == pytest.approx(0.96)
+
+
+def test_index_is_quantized_after_enough_entries():
+    rng = np.random.default_rng(0)
+    keys = rng.standard_normal((12, 16)).astype(np.float32)
+    cache = QVCache(quantize_after=8)
+
+    for i, key in enumerate(keys[:7]):
+        cache.add(key, i)
+    assert not cache.quantized
+
+    for i, key in enumerate(keys[7:], start=7):
+        cache.add(key, i)
+    assert cache.quantized and len(cache) == 12 and cache.index.ntotal == 12
+
+    # int8 codes are approximate, but every stored key still finds itself
+    for i, key in enumerate(keys):
+        assert cache.lookup(key)[1] == i
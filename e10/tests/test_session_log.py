@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from memory.session_log import (
+    flush_session_updates,
+    get_memory_version,
+    get_store_path,
+    live_update_session,
+    write_session_data,
+)
+
+
+class FakeSession:
+    def __init__(self, session_id="abcdef0123456789"):
+        self.session_id = session_id
+        self.state = {"original_goal_achieved": False, "final_answer": None}
+        self.serialized = 0
+
+    def to_json(self):
+        self.serialized += 1
+        return {"session_id": self.session_id, "state_snapshot": dict(self.state)}
+
+
+def read_store(session_id, base_dir):
+    with open(get_store_path(session_id, str(base_dir)), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_write_replaces_the_file_without_leaving_temp_files(tmp_path):
+    path = write_session_data({"session_id": "s1", "step": 1}, str(tmp_path))
+    path = write_session_data({"session_id": "s1", "step": 2}, str(tmp_path))
+
+    assert read_store("s1", tmp_path)["step"] == 2
+    assert [p.name for p in path.parent.iterdir()] == ["s1.json"]
+
+
+def test_live_updates_are_coalesced_until_flushed(tmp_path):
+    session = FakeSession()
+
+    async def main():
+        for answer in ("draft", "better", "final"):
+            session.state["final_answer"] = answer
+            live_update_session(session, str(tmp_path))
+        assert not get_store_path(session.session_id, str(tmp_path)).exists()  # only queued so far
+        await flush_session_updates(fsync=True)
+
+    asyncio.run(main())
+    assert session.serialized == 1
+    stored = read_store(session.session_id, tmp_path)
+    assert stored["state_snapshot"]["final_answer"] == "final"
+    assert stored["_session_id_short"] == "abcdef01"
+
+
+def test_achieved_goal_invalidates_memory_caches(tmp_path):
+    session = FakeSession()
+
+    version = get_memory_version()
+    live_update_session(session, str(tmp_path))  # no running loop: written immediately
+    assert get_memory_version() == version
+
+    session.state["original_goal_achieved"] = True
+    live_update_session(session, str(tmp_path))
+    assert get_memory_version() == version + 1
+    assert read_store(session.session_id, tmp_path)["state_snapshot"]["original_goal_achieved"] is True